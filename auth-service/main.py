@@ -3,22 +3,47 @@ Auth Service - Main Application
 """
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 import logging
+import os
+import sys
+import orjson
+import time
 import uvicorn
 
 from database import engine, Base
+from models.user import User
 from routers import auth as auth_router
+from utils.security import get_password_hash, BCRYPT_COST
 
 # Logging configuration
-logging.basicConfig(
-    level=logging.INFO,
-    format='{"time": "%(asctime)s", "level": "%(levelname)s", "message": "%(message)s", "service": "auth"}',
-    datefmt='%Y-%m-%d %H:%M:%S'
-)
+class JSONFormatter(logging.Formatter):
+    """Render each log record as one JSON line encoded by orjson"""
+    
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record, '%Y-%m-%d %H:%M:%S'),
+            "level": record.levelname,
+            "message": record.getMessage(),
+            "service": "auth"
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return orjson.dumps(entry).decode()
+
+log_handler = logging.StreamHandler(sys.stdout)
+log_handler.setFormatter(JSONFormatter())
+logging.basicConfig(level=logging.INFO, handlers=[log_handler])
 logger = logging.getLogger(__name__)
 
+# Minimum time a single password hash should take to resist offline attacks
+BCRYPT_TARGET_SECONDS = 0.25
+
 # Create database tables
 Base.metadata.create_all(bind=engine)
+# create_all skips indexes on tables that already exist, so add newer ones explicitly
+for index in User.__table__.indexes:
+    index.create(bind=engine, checkfirst=True)
 
 # Create FastAPI app
 app = FastAPI(
@@ -26,21 +51,38 @@ app = FastAPI(
     description="Serviço de autenticação e autorização",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=ORJSONResponse
 )
 
-# CORS configuration
+# CORS configuration (comma-separated CORS_ORIGINS; preflights cached for a day)
+CORS_ORIGINS = [origin.strip() for origin in os.getenv("CORS_ORIGINS", "*").split(",") if origin.strip()]
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],
+    allow_origins=CORS_ORIGINS,
     allow_credentials=True,
-    allow_methods=["*"],
+    allow_methods=["GET", "POST", "PUT", "DELETE"],
     allow_headers=["*"],
+    max_age=86400,
 )
 
 # Include routers
 app.include_router(auth_router.router)
 
+@app.on_event("startup")
+async def calibrate_bcrypt():
+    """Measure the bcrypt hash time for the configured cost on this host"""
+    start = time.perf_counter()
+    get_password_hash("calibration-password")
+    elapsed = time.perf_counter() - start
+    
+    logger.info("bcrypt cost %d takes %.0fms per hash", BCRYPT_COST, elapsed * 1000)
+    if elapsed < BCRYPT_TARGET_SECONDS:
+        logger.warning(
+            "bcrypt cost %d is below the %.0fms target; consider raising BCRYPT_COST",
+            BCRYPT_COST, BCRYPT_TARGET_SECONDS * 1000
+        )
+
 # Health check endpoint
 @app.get("/health", tags=["Health"])
 async def health_check():
@@ -63,10 +105,16 @@ async def root():
     }
 
 if __name__ == "__main__":
+    # Production runs several workers; set RELOAD=1 for local development
+    workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+    reload = os.getenv("RELOAD", "0") == "1"
     uvicorn.run(
         "main:app",
         host="0.0.0.0",
         port=8000,
-        reload=True,
+        workers=workers,
+        reload=reload,
+        loop="uvloop",
+        http="httptools",
         log_level="info"
     )
\ No newline at end of file
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, DateTime, Boolean
+from sqlalchemy import Column, String, DateTime, Boolean, Index
 from sqlalchemy.dialects.postgresql import UUID
 from datetime import datetime
 import uuid
@@ -8,6 +8,10 @@ from database import Base
 class User(Base):
 
     __tablename__ = "users"
+    __table_args__ = (
+        # Covers the login lookup by username together with the active flag
+        Index("ix_users_username_active", "username", "is_active"),
+    )
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     email = Column(String, unique=True, index=True, nullable=False)
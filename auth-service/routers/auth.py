@@ -1,7 +1,9 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import ORJSONResponse
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 from datetime import timedelta
+import anyio
 import jwt
 import logging
 
@@ -10,38 +12,38 @@ from models.user import User
 from schemas.auth import UserCreate, UserResponse, Token, TokenVerify
 from utils.security import (
     verify_password, get_password_hash, create_access_token,
-    create_refresh_token, get_user, get_user_by_email,
-    get_current_active_user, ACCESS_TOKEN_EXPIRE_MINUTES,
-    SECRET_KEY, ALGORITHM
+    create_refresh_token, get_user, get_user_by_email_or_username,
+    get_current_active_user, decode_token, is_token_type, invalidate_user_cache,
+    UserRow, ACCESS_TOKEN_EXPIRE_MINUTES
 )
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(
     prefix="/auth",
-    tags=["Authentication"]
+    tags=["Authentication"],
+    default_response_class=ORJSONResponse
 )
 
 @router.post("/register", response_model=UserResponse)
-async def register(user: UserCreate, db: Session = Depends(get_db)):
+async def register(user: UserCreate, db: Session = Depends(get_db)) -> UserResponse:
     """Register a new user"""
     
-    db_user = get_user_by_email(db, email=user.email)
-    if db_user:
-        raise HTTPException(
-            status_code=400,
-            detail="Email already registered"
-        )
-    
-    db_user = get_user(db, username=user.username)
+    db_user = get_user_by_email_or_username(db, email=user.email, username=user.username)
     if db_user:
+        if db_user.email == user.email:
+            raise HTTPException(
+                status_code=400,
+                detail="Email already registered"
+            )
         raise HTTPException(
             status_code=400,
             detail="Username already taken"
         )
     
     
-    hashed_password = get_password_hash(user.password)
+    # bcrypt is CPU-bound; run it on the threadpool so the event loop keeps serving requests
+    hashed_password = await anyio.to_thread.run_sync(get_password_hash, user.password)
     db_user = User(
         email=user.email,
         username=user.username,
@@ -51,24 +53,20 @@ async def register(user: UserCreate, db: Session = Depends(get_db)):
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
+    invalidate_user_cache(db_user.username)
     
-    logger.info(f"New user registered: {user.username}")
+    logger.info("New user registered: %s", user.username)
     
-    return UserResponse(
-        id=str(db_user.id),
-        email=db_user.email,
-        username=db_user.username,
-        full_name=db_user.full_name,
-        is_active=db_user.is_active,
-        is_admin=db_user.is_admin,
-        created_at=db_user.created_at
-    )
+    return UserResponse.model_validate(db_user)
 
 @router.post("/login", response_model=Token)
-async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)) -> Token:
     """Login endpoint"""
     user = get_user(db, username=form_data.username)
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    # bcrypt is CPU-bound; run it on the threadpool so the event loop keeps serving requests
+    if not user or not await anyio.to_thread.run_sync(
+        verify_password, form_data.password, user.hashed_password
+    ):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
@@ -81,7 +79,7 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session =
     )
     refresh_token = create_refresh_token(data={"sub": user.username})
     
-    logger.info(f"User logged in: {user.username}")
+    logger.info("User logged in: %s", user.username)
     
     return Token(
         access_token=access_token,
@@ -89,7 +87,7 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session =
     )
 
 @router.post("/refresh", response_model=Token)
-async def refresh_token(refresh_token: str, db: Session = Depends(get_db)):
+async def refresh_token(refresh_token: str, db: Session = Depends(get_db)) -> Token:
     """Refresh access token"""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -98,11 +96,10 @@ async def refresh_token(refresh_token: str, db: Session = Depends(get_db)):
     )
     
     try:
-        payload = jwt.decode(refresh_token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = decode_token(refresh_token)
         username: str = payload.get("sub")
-        token_type: str = payload.get("type")
         
-        if username is None or token_type != "refresh":
+        if username is None or not is_token_type(payload, "refresh"):
             raise credentials_exception
             
         user = get_user(db, username=username)
@@ -124,26 +121,26 @@ async def refresh_token(refresh_token: str, db: Session = Depends(get_db)):
     )
 
 @router.get("/me", response_model=UserResponse)
-async def read_users_me(current_user: User = Depends(get_current_active_user)):
+async def read_users_me(current_user: UserRow = Depends(get_current_active_user)) -> UserResponse:
     """Get current user info"""
-    return UserResponse(
-        id=str(current_user.id),
-        email=current_user.email,
-        username=current_user.username,
-        full_name=current_user.full_name,
-        is_active=current_user.is_active,
-        is_admin=current_user.is_admin,
-        created_at=current_user.created_at
-    )
+    return UserResponse.model_validate(current_user)
 
+@router.get("/verify", response_model=TokenVerify)
 @router.post("/verify", response_model=TokenVerify)
-async def verify_token_endpoint(token: str):
+async def verify_token_endpoint(token: str) -> TokenVerify:
     """Verify if token is valid"""
+    invalid_token_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid token"
+    )
+    
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return TokenVerify(valid=True, username=payload.get("sub"))
+        payload = decode_token(token)
     except jwt.PyJWTError:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid token"
-        )
\ No newline at end of file
+        raise invalid_token_exception
+    
+    username = payload.get("sub")
+    if not isinstance(username, str):
+        raise invalid_token_exception
+    
+    return TokenVerify(valid=True, username=username)
\ No newline at end of file
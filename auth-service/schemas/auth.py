@@ -1,7 +1,7 @@
 """
 Pydantic schemas for authentication service
 """
-from pydantic import BaseModel, EmailStr, Field
+from pydantic import BaseModel, EmailStr, Field, validator
 from typing import Optional
 from datetime import datetime
 
@@ -27,6 +27,11 @@ class UserResponse(BaseModel):
     is_admin: bool
     created_at: datetime
     
+    @validator('id', pre=True)
+    def stringify_id(cls, v):
+        # ORM rows carry a UUID; the API exposes it as a string
+        return str(v)
+    
     class Config:
         from_attributes = True
 
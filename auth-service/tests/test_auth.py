@@ -3,8 +3,9 @@ Tests for Patient Service
 """
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
 from datetime import date
 import sys
 import os
@@ -14,24 +15,30 @@ import io
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from main import app
-from database import Base, get_db
+# Tests roll back their data, so cached responses would leak between them
+os.environ.setdefault("CACHE_ENABLED", "false")
 
+from main import app
+from database import Base, get_db, get_db_ro
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./test_patients.db"
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
-TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-Base.metadata.create_all(bind=engine)
+# One in-memory database shared by every test through a single connection
+SQLALCHEMY_DATABASE_URL = "sqlite://"
+engine = create_engine(
+    SQLALCHEMY_DATABASE_URL,
+    connect_args={"check_same_thread": False},
+    poolclass=StaticPool
+)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False)
 
-def override_get_db():
-    try:
-        db = TestingSessionLocal()
-        yield db
-    finally:
-        db.close()
+# Let SQLAlchemy emit BEGIN itself so SAVEPOINTs work with pysqlite
+@event.listens_for(engine, "connect")
+def do_connect(dbapi_connection, connection_record):
+    dbapi_connection.isolation_level = None
 
-app.dependency_overrides[get_db] = override_get_db
+@event.listens_for(engine, "begin")
+def do_begin(conn):
+    conn.exec_driver_sql("BEGIN")
 
 client = TestClient(app)
 
@@ -56,12 +63,34 @@ def sample_patient():
         "allergies": ["Dipirona"]
     }
 
-@pytest.fixture(autouse=True)
-def cleanup():
-    """Clean up database before each test"""
-    Base.metadata.drop_all(bind=engine)
+@pytest.fixture(scope="session", autouse=True)
+def _schema():
+    """Create the schema once for the whole test session"""
     Base.metadata.create_all(bind=engine)
     yield
+    Base.metadata.drop_all(bind=engine)
+
+@pytest.fixture(autouse=True)
+def db_session(_schema):
+    """Run each test inside a transaction that is rolled back afterwards"""
+    connection = engine.connect()
+    transaction = connection.begin()
+    # Commits in the app only release savepoints inside the outer transaction
+    session = TestingSessionLocal(bind=connection, join_transaction_mode="create_savepoint")
+    
+    def override_get_db():
+        yield session
+    
+    # Reads share the session so they see the test's uncommitted writes
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_db_ro] = override_get_db
+    yield session
+    
+    app.dependency_overrides.pop(get_db, None)
+    app.dependency_overrides.pop(get_db_ro, None)
+    session.close()
+    transaction.rollback()
+    connection.close()
 
 class TestPatientEndpoints:
     """Test patient CRUD operations"""
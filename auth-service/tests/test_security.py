@@ -0,0 +1,42 @@
+"""
+Tests for password hashing
+"""
+import bcrypt
+import sys
+import os
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# The cheapest bcrypt cost keeps the hashing tests fast
+os.environ.setdefault("BCRYPT_COST", "4")
+
+from utils.security import PREHASH_PREFIX, get_password_hash, verify_password
+
+
+class TestPasswordHashing:
+    """Test get_password_hash and verify_password"""
+    
+    def test_hash_round_trip(self):
+        """Test that a new hash is prefixed and verifies its password"""
+        hashed = get_password_hash("secret123")
+        assert hashed.startswith(PREHASH_PREFIX)
+        assert verify_password("secret123", hashed)
+    
+    def test_wrong_password(self):
+        """Test that a different password is rejected"""
+        hashed = get_password_hash("secret123")
+        assert not verify_password("secret124", hashed)
+    
+    def test_long_password_is_not_truncated(self):
+        """Test that bytes past bcrypt's 72-byte limit still count"""
+        password = "p" * 72 + "-suffix"
+        hashed = get_password_hash(password)
+        assert verify_password(password, hashed)
+        assert not verify_password(password[:73], hashed)
+    
+    def test_legacy_bcrypt_hash(self):
+        """Test that plain bcrypt hashes from before the prefix still verify"""
+        hashed = bcrypt.hashpw(b"secret123", bcrypt.gensalt(rounds=4)).decode()
+        assert verify_password("secret123", hashed)
+        assert not verify_password("secret124", hashed)
@@ -2,12 +2,23 @@
 Security utilities for authentication
 """
 import os
+import base64
+import calendar
+import hashlib
+import hmac
+import queue
+import threading
+import time
+from collections import namedtuple
 from datetime import datetime, timedelta
 from typing import Optional
 import jwt
-from passlib.context import CryptContext
+import bcrypt
+import orjson
+from cachetools import TTLCache
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import or_
 from sqlalchemy.orm import Session
 
 from database import get_db
@@ -19,20 +30,99 @@ SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-here-change-in-production"
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
 REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "7"))
+BCRYPT_COST = int(os.getenv("BCRYPT_COST", "12"))
+SECRET_KEY_BYTES = SECRET_KEY.encode()
 
+# Decode settings shared by every verification instead of rebuilt per call
+_ALGS = [ALGORITHM]
+_REQUIRED_CLAIMS = ("exp", "sub", "type")
+_DECODE_OPTS = {"require": list(_REQUIRED_CLAIMS), "verify_signature": True}
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Marks hashes whose input was pre-hashed with SHA-256; older hashes are plain bcrypt
+PREHASH_PREFIX = "sha256$"
 
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+# Session-independent copy of the user columns the endpoints need, safe to share
+# across requests (an ORM instance is bound to the session that loaded it)
+UserRow = namedtuple(
+    "UserRow",
+    ["id", "email", "username", "full_name", "hashed_password", "is_active", "is_admin", "created_at"]
+)
+
+# Per-process cache of username lookups; entries expire quickly so changes to a
+# user (e.g. deactivation) propagate to every worker within USER_CACHE_TTL seconds
+USER_CACHE_TTL = 30
+_user_cache = TTLCache(maxsize=10_000, ttl=USER_CACHE_TTL)
+_user_cache_lock = threading.Lock()
+
+# Verified token payloads keyed by the token's SHA-256 digest, so hot tokens
+# (e.g. the gateway verifying on every request) skip signature checks; only
+# successful verifications are stored and expiry is re-checked on every hit
+VERIFY_CACHE_TTL = 60
+_verify_cache = TTLCache(maxsize=50_000, ttl=VERIFY_CACHE_TTL)
+_verify_cache_lock = threading.Lock()
+
+# Salts are generated ahead of time by a daemon thread so registration bursts
+# don't pay for the RNG call; an empty pool (e.g. at startup) falls back to gensalt
+SALT_POOL_SIZE = 256
+_salt_pool = queue.Queue(maxsize=SALT_POOL_SIZE)
+
+def _refill_salt_pool():
+    """Keep the salt pool topped up; blocks while the pool is full"""
+    while True:
+        _salt_pool.put(bcrypt.gensalt(rounds=BCRYPT_COST))
+
+threading.Thread(target=_refill_salt_pool, name="bcrypt-salt-pool", daemon=True).start()
+
+def _get_salt() -> bytes:
+    """Take a pre-generated bcrypt salt, generating one if the pool is empty"""
+    try:
+        return _salt_pool.get_nowait()
+    except queue.Empty:
+        return bcrypt.gensalt(rounds=BCRYPT_COST)
+
+def _prehash(password: str) -> bytes:
+    """SHA-256 a password so bcrypt never truncates it at 72 bytes or sees NUL bytes"""
+    return hashlib.sha256(password.encode()).hexdigest().encode()
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against its hash"""
-    return pwd_context.verify(plain_password, hashed_password)
+    if hashed_password.startswith(PREHASH_PREFIX):
+        return bcrypt.checkpw(
+            _prehash(plain_password),
+            hashed_password[len(PREHASH_PREFIX):].encode()
+        )
+    # Legacy hashes (e.g. created through passlib) are bcrypt over the raw password
+    return bcrypt.checkpw(plain_password.encode(), hashed_password.encode())
 
 def get_password_hash(password: str) -> str:
     """Hash a password"""
-    return pwd_context.hash(password)
+    hashed = bcrypt.hashpw(_prehash(password), _get_salt())
+    return PREHASH_PREFIX + hashed.decode()
+
+def _base64url_encode(data: bytes) -> bytes:
+    """Encode bytes as an unpadded base64url JWT segment"""
+    return base64.urlsafe_b64encode(data).rstrip(b"=")
+
+def _base64url_decode(segment: bytes) -> bytes:
+    """Decode an unpadded base64url JWT segment"""
+    return base64.urlsafe_b64decode(segment + b"=" * (-len(segment) % 4))
+
+# Every HS256 token carries the same header, so its segment is encoded once
+_HS256_HEADER_SEGMENT = _base64url_encode(orjson.dumps({"alg": "HS256", "typ": "JWT"}))
+
+def _encode_token(claims: dict) -> str:
+    """Sign claims as a JWT with the configured algorithm"""
+    if ALGORITHM != "HS256":
+        return jwt.encode(claims, SECRET_KEY_BYTES, algorithm=ALGORITHM)
+    for claim in ("exp", "iat", "nbf"):
+        if isinstance(claims.get(claim), datetime):
+            claims[claim] = calendar.timegm(claims[claim].utctimetuple())
+    signing_input = _HS256_HEADER_SEGMENT + b"." + _base64url_encode(orjson.dumps(claims))
+    signature = hmac.new(SECRET_KEY_BYTES, signing_input, hashlib.sha256).digest()
+    return (signing_input + b"." + _base64url_encode(signature)).decode()
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Create a JWT access token"""
@@ -42,7 +132,7 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     else:
         expire = datetime.utcnow() + timedelta(minutes=15)
     to_encode.update({"exp": expire, "type": "access"})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    encoded_jwt = _encode_token(to_encode)
     return encoded_jwt
 
 def create_refresh_token(data: dict) -> str:
@@ -50,13 +140,89 @@ def create_refresh_token(data: dict) -> str:
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
     to_encode.update({"exp": expire, "type": "refresh"})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    encoded_jwt = _encode_token(to_encode)
     return encoded_jwt
 
+def _verify_hs256(token: str, key: bytes) -> dict:
+    """Verify an HS256 JWT with a single HMAC and return its payload
+    
+    Raises the same jwt.PyJWTError subclasses as jwt.decode so callers can
+    treat both paths alike.
+    """
+    try:
+        signing_input, _, signature_segment = token.encode().rpartition(b".")
+        header_segment, _, payload_segment = signing_input.partition(b".")
+        if not header_segment or b"." in payload_segment:
+            raise jwt.DecodeError("Not enough segments")
+        header = orjson.loads(_base64url_decode(header_segment))
+        payload = orjson.loads(_base64url_decode(payload_segment))
+        signature = _base64url_decode(signature_segment)
+    except ValueError:
+        raise jwt.DecodeError("Invalid token encoding")
+    
+    if not isinstance(header, dict) or header.get("alg") != "HS256":
+        raise jwt.InvalidAlgorithmError("The specified alg value is not allowed")
+    
+    expected = hmac.new(key, signing_input, hashlib.sha256).digest()
+    if not hmac.compare_digest(signature, expected):
+        raise jwt.InvalidSignatureError("Signature verification failed")
+    
+    if not isinstance(payload, dict):
+        raise jwt.DecodeError("Invalid payload")
+    for claim in _REQUIRED_CLAIMS:
+        if payload.get(claim) is None:
+            raise jwt.MissingRequiredClaimError(claim)
+    
+    now = time.time()
+    exp = payload.get("exp")
+    if exp is not None:
+        if not isinstance(exp, (int, float)):
+            raise jwt.DecodeError("Expiration Time claim (exp) must be a number")
+        if exp <= now:
+            raise jwt.ExpiredSignatureError("Signature has expired")
+    nbf = payload.get("nbf")
+    if nbf is not None and (not isinstance(nbf, (int, float)) or nbf > now):
+        raise jwt.ImmatureSignatureError("The token is not yet valid (nbf)")
+    if "aud" in payload:
+        # Tokens issued here never carry an audience; mirror jwt.decode's default
+        raise jwt.InvalidAudienceError("Invalid audience")
+    
+    return payload
+
+def _decode_token_uncached(token: str) -> dict:
+    """Verify and decode a JWT with the configured algorithm"""
+    if ALGORITHM == "HS256":
+        return _verify_hs256(token, SECRET_KEY_BYTES)
+    return jwt.decode(token, SECRET_KEY_BYTES, algorithms=_ALGS, options=_DECODE_OPTS)
+
+def decode_token(token: str) -> dict:
+    """Decode a JWT, reusing the verified payload of recently seen tokens"""
+    key = hashlib.sha256(token.encode()).digest()
+    with _verify_cache_lock:
+        payload = _verify_cache.get(key)
+    if payload is None:
+        # Failures raise here and are never cached
+        payload = _decode_token_uncached(token)
+        with _verify_cache_lock:
+            _verify_cache[key] = payload
+    
+    # Cache hits skip verification, so expiry must be checked on every call
+    exp = payload.get("exp")
+    if exp is not None and exp < time.time():
+        raise jwt.ExpiredSignatureError("Signature has expired")
+    return payload
+
+def is_token_type(payload: dict, expected: str) -> bool:
+    """Check the token type claim in constant time"""
+    token_type = payload.get("type")
+    if not isinstance(token_type, str):
+        return False
+    return hmac.compare_digest(token_type.encode(), expected.encode())
+
 def verify_token(token: str, credentials_exception):
     """Verify a JWT token"""
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = decode_token(token)
         username: str = payload.get("sub")
         if username is None:
             raise credentials_exception
@@ -65,14 +231,37 @@ def verify_token(token: str, credentials_exception):
     except jwt.PyJWTError:
         raise credentials_exception
 
-def get_user(db: Session, username: str):
+def get_user(db: Session, username: str) -> Optional[UserRow]:
     """Get user by username"""
-    return db.query(User).filter(User.username == username).first()
+    with _user_cache_lock:
+        cached = _user_cache.get(username)
+    if cached is not None:
+        return cached
+    
+    user = db.query(User).filter(User.username == username).first()
+    if user is None:
+        return None
+    
+    row = UserRow(*(getattr(user, field) for field in UserRow._fields))
+    with _user_cache_lock:
+        _user_cache[username] = row
+    return row
+
+def invalidate_user_cache(username: str):
+    """Drop a cached user lookup after the user row changes"""
+    with _user_cache_lock:
+        _user_cache.pop(username, None)
 
 def get_user_by_email(db: Session, email: str):
     """Get user by email"""
     return db.query(User).filter(User.email == email).first()
 
+def get_user_by_email_or_username(db: Session, email: str, username: str):
+    """Get a user matching either the email or the username in one query"""
+    return db.query(User).filter(
+        or_(User.email == email, User.username == username)
+    ).first()
+
 async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
     """Get current user from JWT token"""
     credentials_exception = HTTPException(
@@ -86,13 +275,13 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
         raise credentials_exception
     return user
 
-async def get_current_active_user(current_user: User = Depends(get_current_user)):
+async def get_current_active_user(current_user: UserRow = Depends(get_current_user)):
     """Get current active user"""
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
 
-async def get_admin_user(current_user: User = Depends(get_current_active_user)):
+async def get_admin_user(current_user: UserRow = Depends(get_current_active_user)):
     """Get current admin user"""
     if not current_user.is_admin:
         raise HTTPException(
@@ -0,0 +1,54 @@
+"""Initial patients table
+
+Revision ID: 0001
+Revises: 
+Create Date: 2026-10-15 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0001'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # The services create this table at startup, so existing databases already have it
+    if not op.get_context().as_sql and sa.inspect(op.get_bind()).has_table("patients"):
+        return
+    
+    op.create_table(
+        "patients",
+        sa.Column("id", postgresql.UUID(as_uuid=True), primary_key=True),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("cpf", sa.String(length=11), nullable=False),
+        sa.Column("birth_date", sa.Date(), nullable=False),
+        sa.Column("gender", sa.String(length=1), nullable=False),
+        sa.Column("email", sa.String(), nullable=True),
+        sa.Column("phone", sa.String(), nullable=True),
+        sa.Column("address", sa.JSON(), nullable=True),
+        sa.Column("medical_conditions", sa.JSON(), nullable=True),
+        sa.Column("medications", sa.JSON(), nullable=True),
+        sa.Column("allergies", sa.JSON(), nullable=True),
+        sa.Column("emergency_contact", sa.JSON(), nullable=True),
+        sa.Column("insurance_info", sa.JSON(), nullable=True),
+        sa.Column("notes", sa.Text(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+        sa.Column("created_by", sa.String(), nullable=True),
+    )
+    op.create_index("ix_patients_name", "patients", ["name"])
+    op.create_index("ix_patients_cpf", "patients", ["cpf"], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_patients_cpf", table_name="patients")
+    op.drop_index("ix_patients_name", table_name="patients")
+    op.drop_table("patients")
@@ -0,0 +1,29 @@
+"""Index patients on (created_at, id) for keyset pagination
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-15 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # IF NOT EXISTS: databases created by create_all after this change already have it
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_patients_created_at_id "
+        "ON patients (created_at DESC, id DESC)"
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_patients_created_at_id")
@@ -0,0 +1,38 @@
+"""Store patient JSON columns as JSONB and GIN-index medical_conditions
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-15 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+JSON_COLUMNS = (
+    "address", "medical_conditions", "medications",
+    "allergies", "emergency_contact", "insurance_info",
+)
+
+
+def upgrade() -> None:
+    for column in JSON_COLUMNS:
+        op.execute(f"ALTER TABLE patients ALTER COLUMN {column} TYPE JSONB USING {column}::jsonb")
+    # IF NOT EXISTS: databases created by create_all after this change already have it
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_patients_medical_conditions_gin "
+        "ON patients USING gin (medical_conditions jsonb_path_ops)"
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_patients_medical_conditions_gin")
+    for column in JSON_COLUMNS:
+        op.execute(f"ALTER TABLE patients ALTER COLUMN {column} TYPE JSON USING {column}::json")
@@ -0,0 +1,32 @@
+"""GIN-index the medications and allergies lists
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-15 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+GIN_COLUMNS = ("medications", "allergies")
+
+
+def upgrade() -> None:
+    for column in GIN_COLUMNS:
+        op.execute(
+            f"CREATE INDEX IF NOT EXISTS ix_patients_{column}_gin "
+            f"ON patients USING gin ({column} jsonb_path_ops)"
+        )
+
+
+def downgrade() -> None:
+    for column in GIN_COLUMNS:
+        op.execute(f"DROP INDEX IF EXISTS ix_patients_{column}_gin")
@@ -0,0 +1,34 @@
+"""Trigram indexes for ILIKE search on name, cpf, email and notes
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-15 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0005'
+down_revision: Union[str, None] = '0004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TRGM_COLUMNS = ("name", "cpf", "email", "notes")
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for column in TRGM_COLUMNS:
+        op.execute(
+            f"CREATE INDEX IF NOT EXISTS ix_patients_{column}_trgm "
+            f"ON patients USING gin ({column} gin_trgm_ops)"
+        )
+
+
+def downgrade() -> None:
+    # pg_trgm stays installed; other objects may depend on it
+    for column in TRGM_COLUMNS:
+        op.execute(f"DROP INDEX IF EXISTS ix_patients_{column}_trgm")
@@ -0,0 +1,25 @@
+"""Index patients.birth_date for age and birth date range filters
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-15 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0006'
+down_revision: Union[str, None] = '0005'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("CREATE INDEX IF NOT EXISTS ix_patients_birth_date ON patients (birth_date)")
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_patients_birth_date")
@@ -0,0 +1,27 @@
+"""Composite (sort column, id) indexes for search keyset pagination
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-15 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0007'
+down_revision: Union[str, None] = '0006'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("CREATE INDEX IF NOT EXISTS ix_patients_name_id ON patients (name, id)")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_patients_birth_date_id ON patients (birth_date, id)")
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_patients_birth_date_id")
+    op.execute("DROP INDEX IF EXISTS ix_patients_name_id")
@@ -0,0 +1,30 @@
+"""Drop the single-column name and birth_date indexes
+
+The (name, id) and (birth_date, id) indexes from 0007 serve every lookup
+these did, so they only cost writes and space.
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-15 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0009'
+down_revision: Union[str, None] = '0008'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_patients_name")
+    op.execute("DROP INDEX IF EXISTS ix_patients_birth_date")
+
+
+def downgrade() -> None:
+    op.execute("CREATE INDEX IF NOT EXISTS ix_patients_birth_date ON patients (birth_date)")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_patients_name ON patients (name)")
@@ -1,31 +1,69 @@
 """
 Patient model for patient service
 """
-from sqlalchemy import Column, String, Date, DateTime, Text, JSON
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import Column, String, Date, DateTime, Text, JSON, Index, DDL, event
+from sqlalchemy.dialects.postgresql import UUID, JSONB
 from datetime import datetime
 import uuid
 
 from database import Base
 
+# JSONB on Postgres (GIN-indexable, used with the jsonb_* functions); plain JSON
+# elsewhere, e.g. SQLite in tests
+JSONType = JSON().with_variant(JSONB(), "postgresql")
+
 class Patient(Base):
     """Patient model"""
     __tablename__ = "patients"
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    name = Column(String, nullable=False, index=True)
+    name = Column(String, nullable=False)
     cpf = Column(String(11), unique=True, nullable=False, index=True)
     birth_date = Column(Date, nullable=False)
     gender = Column(String(1), nullable=False)
     email = Column(String, nullable=True)
     phone = Column(String, nullable=True)
-    address = Column(JSON, nullable=True)
-    medical_conditions = Column(JSON, default=list)
-    medications = Column(JSON, default=list)
-    allergies = Column(JSON, default=list)
-    emergency_contact = Column(JSON, nullable=True)
-    insurance_info = Column(JSON, nullable=True)
+    address = Column(JSONType, nullable=True)
+    medical_conditions = Column(JSONType, default=list)
+    medications = Column(JSONType, default=list)
+    allergies = Column(JSONType, default=list)
+    emergency_contact = Column(JSONType, nullable=True)
+    insurance_info = Column(JSONType, nullable=True)
     notes = Column(Text, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
-    created_by = Column(String, nullable=True)
\ No newline at end of file
+    created_by = Column(String, nullable=True)
+    
+    __table_args__ = (
+        # Keyset pagination walks patients newest first
+        Index("ix_patients_created_at_id", created_at.desc(), id.desc()),
+        # Search keyset pagination by name or birth date, id breaking ties
+        Index("ix_patients_name_id", name, id),
+        Index("ix_patients_birth_date_id", birth_date, id),
+        # LIKE 'digits%' prefix search on CPF, whatever the database collation
+        Index("ix_patients_cpf_prefix", cpf, postgresql_ops={"cpf": "text_pattern_ops"}),
+        # Containment (@>) lookups on the medical lists
+        Index(
+            "ix_patients_medical_conditions_gin", medical_conditions,
+            postgresql_using="gin", postgresql_ops={"medical_conditions": "jsonb_path_ops"}
+        ),
+        Index(
+            "ix_patients_medications_gin", medications,
+            postgresql_using="gin", postgresql_ops={"medications": "jsonb_path_ops"}
+        ),
+        Index(
+            "ix_patients_allergies_gin", allergies,
+            postgresql_using="gin", postgresql_ops={"allergies": "jsonb_path_ops"}
+        ),
+        # Trigram indexes serve the ILIKE '%term%' search filters (needs pg_trgm)
+        Index("ix_patients_name_trgm", name, postgresql_using="gin", postgresql_ops={"name": "gin_trgm_ops"}),
+        Index("ix_patients_cpf_trgm", cpf, postgresql_using="gin", postgresql_ops={"cpf": "gin_trgm_ops"}),
+        Index("ix_patients_email_trgm", email, postgresql_using="gin", postgresql_ops={"email": "gin_trgm_ops"}),
+        Index("ix_patients_notes_trgm", notes, postgresql_using="gin", postgresql_ops={"notes": "gin_trgm_ops"}),
+    )
+
+# The trigram indexes need pg_trgm, so enable it before creating the table
+event.listen(
+    Patient.__table__, "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql")
+)
@@ -2,64 +2,208 @@
 Patient routes
 """
 from fastapi import APIRouter, Depends, HTTPException, status, File, UploadFile, Query
+from sqlalchemy import select, insert, update, delete, func, tuple_, case, and_, or_
+from sqlalchemy.dialects import postgresql
 from sqlalchemy.orm import Session
 from typing import Optional
-import json
+import anyio
+import base64
+import ijson
+import itertools
+import orjson
+import os
+import threading
 import uuid
 import logging
-from datetime import datetime
+import multiprocessing
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
 
-from database import get_db
+from database import get_db, get_db_ro
 from models.patient import Patient
 from schemas.patient import (
     PatientCreate, PatientUpdate, PatientResponse,
     PaginatedResponse, ImportResponse, StatsResponse
 )
 from utils.auth import verify_token
+from utils.cache import cache_get, cache_set, invalidate_patients, STATS_CACHE_KEY, STATS_CACHE_TTL
 
 # Logger
 logger = logging.getLogger(__name__)
 
+# Rows sent to the database per executemany during imports
+IMPORT_BATCH_SIZE = 1000
+# Uploads up to this size are parsed whole with orjson instead of streamed
+IMPORT_ORJSON_MAX_BYTES = 8 * 1024 * 1024
+# Entries validated per worker process task, and how many tasks may be in flight;
+# each server worker (WEB_CONCURRENCY) gets its share of the CPUs for validation
+# processes so a burst of imports can't oversubscribe the host
+IMPORT_VALIDATION_CHUNK = 500
+IMPORT_VALIDATION_WORKERS = int(os.getenv(
+    "IMPORT_VALIDATION_WORKERS",
+    str(max(1, (os.cpu_count() or 1) // int(os.getenv("WEB_CONCURRENCY", "1"))))
+))
+IMPORT_MAX_PENDING_CHUNKS = IMPORT_VALIDATION_WORKERS * 2
+
+# Stats age buckets: each bound is the lowest age of the next bucket
+AGE_BUCKET_BOUNDS = (19, 31, 51, 71)
+AGE_BUCKET_LABELS = ("0-18", "19-30", "31-50", "51-70", "70+")
+
+# Imports running at once per worker; more wait here so a burst of uploads
+# can't take every pooled connection from the read endpoints
+IMPORT_CONCURRENCY = 4
+_import_semaphore = anyio.Semaphore(IMPORT_CONCURRENCY)
+
+# Process pool for import validation, created on the first large import; its
+# processes are spawned rather than forked from this threaded server process,
+# which holds live DB/Redis sockets and locks a fork would copy mid-use
+_validation_pool = None
+_validation_pool_lock = threading.Lock()
+
+# Columns PatientResponse is built from; the list endpoint selects only these
+# so no ORM instances (identity map, attribute instrumentation) are created
+LIST_COLUMNS = (
+    Patient.id, Patient.name, Patient.cpf, Patient.birth_date, Patient.gender,
+    Patient.email, Patient.phone, Patient.address, Patient.medical_conditions,
+    Patient.medications, Patient.allergies, Patient.emergency_contact,
+    Patient.insurance_info, Patient.notes, Patient.created_at, Patient.updated_at
+)
+
 # Create router
+# Handlers that only touch the synchronous Session are plain `def` so FastAPI
+# runs them on its threadpool instead of blocking the event loop; they reach
+# the async cache client through anyio.from_thread
 router = APIRouter(
     prefix="/patients",
     tags=["Patients"]
 )
 
+def _encode_cursor(patient) -> str:
+    """Encode a patient's (created_at, id) position as an opaque cursor"""
+    raw = f"{patient.created_at.isoformat()}|{patient.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def _decode_cursor(cursor: str):
+    """Decode a cursor produced by _encode_cursor"""
+    try:
+        created_at, patient_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), uuid.UUID(patient_id)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+def _response_from_row(row) -> PatientResponse:
+    """Build a response from a LIST_COLUMNS row, skipping validation of trusted DB data"""
+    data = dict(row._mapping)
+    data.pop("total_count", None)
+    data["id"] = str(data["id"])
+    for field in ("medical_conditions", "medications", "allergies"):
+        data[field] = data[field] or []
+    return PatientResponse.model_construct(**data)
+
 @router.get("", response_model=PaginatedResponse)
-async def list_patients(
+def list_patients(
     page: int = Query(1, ge=1),
     size: int = Query(10, ge=1, le=100),
-    db: Session = Depends(get_db),
+    after: Optional[str] = Query(None, description="Cursor returned as next_cursor by the previous page"),
+    db: Session = Depends(get_db_ro),
     # auth: dict = Depends(verify_token)
 ):
     """List all patients with pagination"""
-    offset = (page - 1) * size
+    stmt = select(*LIST_COLUMNS).order_by(Patient.created_at.desc(), Patient.id.desc())
+    
+    if after:
+        # Keyset pagination seeks straight past the cursor and skips the count
+        created_at, patient_id = _decode_cursor(after)
+        stmt = stmt.where(tuple_(Patient.created_at, Patient.id) < tuple_(created_at, patient_id))
+        total = None
+    else:
+        # The window count rides along with the page, saving a COUNT round trip
+        stmt = stmt.add_columns(func.count().over().label("total_count")).offset((page - 1) * size)
     
-    query = db.query(Patient)
-    total = query.count()
-    patients = query.offset(offset).limit(size).all()
+    # Fetch one extra row to know whether another page follows
+    rows = db.execute(stmt.limit(size + 1)).all()
+    if not after:
+        # A page past the end has no rows to carry the count
+        total = rows[0].total_count if rows else db.query(func.count(Patient.id)).scalar()
+    next_cursor = _encode_cursor(rows[size - 1]) if len(rows) > size else None
+    rows = rows[:size]
     
     return PaginatedResponse(
-        items=[PatientResponse.from_orm_model(p) for p in patients],
+        items=[_response_from_row(row) for row in rows],
         total=total,
         page=page,
         size=size,
-        pages=(total + size - 1) // size
+        pages=(total + size - 1) // size if total is not None else None,
+        next_cursor=next_cursor
     )
 
-@router.get("/stats/summary", response_model=StatsResponse)
-async def get_stats(
-    db: Session = Depends(get_db),
-    # auth: dict = Depends(verify_token)
-):
-    """Get patient statistics"""
-    total = db.query(Patient).count()
+def _years_before(day: date, years: int) -> date:
+    """The same calendar day `years` earlier (Feb 29 falls back to Feb 28)"""
+    try:
+        return day.replace(year=day.year - years)
+    except ValueError:
+        return day.replace(year=day.year - years, day=28)
+
+def _top_conditions(db: Session) -> dict:
+    """Count the ten most common medical conditions"""
+    if db.bind.dialect.name == "postgresql":
+        condition = func.jsonb_array_elements_text(Patient.medical_conditions).label("condition")
+        conditions = (
+            db.query(condition)
+            .filter(func.jsonb_typeof(Patient.medical_conditions) == "array")
+            .subquery()
+        )
+        rows = (
+            db.query(conditions.c.condition, func.count().label("count"))
+            .group_by(conditions.c.condition)
+            .order_by(func.count().desc(), conditions.c.condition)
+            .limit(10)
+            .all()
+        )
+        return {condition: count for condition, count in rows}
+    
+    # Other dialects (SQLite in tests): count in Python over the single column
+    condition_counts = Counter()
+    for (conditions,) in db.query(Patient.medical_conditions).yield_per(1000):
+        if conditions:
+            condition_counts.update(conditions)
+    return dict(condition_counts.most_common(10))
+
+def _compute_stats(db: Session) -> StatsResponse:
+    """Aggregate patient statistics in the database"""
+    today = date.today()
+    
+    # Age buckets become birth date ranges: age >= n  <=>  birth_date <= n years ago
+    def born_by(age: int):
+        return Patient.birth_date <= _years_before(today, age)
+    
+    def count_if(condition):
+        return func.sum(case((condition, 1), else_=0))
     
-    # Get all patients for statistics
-    patients = db.query(Patient).all()
+    # Integer ages sum to today.year - birth year, minus one for each birthday still ahead this year
+    birth_month = func.extract("month", Patient.birth_date)
+    birthday_pending = or_(
+        birth_month > today.month,
+        and_(birth_month == today.month, func.extract("day", Patient.birth_date) > today.day)
+    )
+    
+    # One threshold test per bucket bound; adjacent cumulative counts give the buckets
+    row = db.query(
+        func.count(Patient.id).label("total"),
+        *(count_if(born_by(bound)).label(f"aged_{bound}") for bound in AGE_BUCKET_BOUNDS),
+        count_if(Patient.gender == "M").label("gender_m"),
+        count_if(Patient.gender == "F").label("gender_f"),
+        count_if(Patient.gender == "O").label("gender_o"),
+        func.sum(func.extract("year", Patient.birth_date)).label("birth_year_sum"),
+        count_if(birthday_pending).label("birthdays_pending")
+    ).one()
     
-    if not patients:
+    total = row.total
+    if not total:
         return StatsResponse(
             total_patients=0,
             age_distribution={},
@@ -68,74 +212,63 @@ async def get_stats(
             average_age=0
         )
     
-    # Age distribution
-    ages = [PatientResponse.calculate_age(p.birth_date) for p in patients]
-    
-    age_groups = {
-        "0-18": sum(1 for a in ages if a <= 18),
-        "19-30": sum(1 for a in ages if 19 <= a <= 30),
-        "31-50": sum(1 for a in ages if 31 <= a <= 50),
-        "51-70": sum(1 for a in ages if 51 <= a <= 70),
-        "70+": sum(1 for a in ages if a > 70)
-    }
-    
-    # Gender distribution
-    gender_dist = {
-        "M": db.query(Patient).filter(Patient.gender == "M").count(),
-        "F": db.query(Patient).filter(Patient.gender == "F").count(),
-        "O": db.query(Patient).filter(Patient.gender == "O").count()
-    }
-    
-    # Common conditions
-    all_conditions = []
-    for p in patients:
-        if p.medical_conditions:
-            all_conditions.extend(p.medical_conditions)
-    
-    condition_counts = {}
-    for condition in all_conditions:
-        condition_counts[condition] = condition_counts.get(condition, 0) + 1
+    age_sum = total * today.year - float(row.birth_year_sum) - row.birthdays_pending
     
-    top_conditions = dict(sorted(condition_counts.items(), key=lambda x: x[1], reverse=True)[:10])
+    aged_at_least = [total, *(getattr(row, f"aged_{bound}") for bound in AGE_BUCKET_BOUNDS), 0]
     
     return StatsResponse(
         total_patients=total,
-        age_distribution=age_groups,
-        gender_distribution=gender_dist,
-        top_conditions=top_conditions,
-        average_age=sum(ages) / len(ages) if ages else 0
+        age_distribution={
+            label: aged_at_least[i] - aged_at_least[i + 1]
+            for i, label in enumerate(AGE_BUCKET_LABELS)
+        },
+        gender_distribution={
+            "M": row.gender_m,
+            "F": row.gender_f,
+            "O": row.gender_o
+        },
+        top_conditions=_top_conditions(db),
+        average_age=age_sum / total
     )
 
+@router.get("/stats/summary", response_model=StatsResponse)
+async def get_stats(
+    db: Session = Depends(get_db_ro),
+    # auth: dict = Depends(verify_token)
+):
+    """Get patient statistics"""
+    cached = await cache_get(STATS_CACHE_KEY)
+    if cached:
+        return StatsResponse.model_validate(orjson.loads(cached))
+    
+    # The aggregate query blocks; keep it off the event loop
+    stats = await anyio.to_thread.run_sync(_compute_stats, db)
+    await cache_set(STATS_CACHE_KEY, orjson.dumps(stats.model_dump()), STATS_CACHE_TTL)
+    return stats
+
 @router.get("/{patient_id}", response_model=PatientResponse)
-async def get_patient(
+def get_patient(
     patient_id: str,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_db_ro),
     # auth: dict = Depends(verify_token)
 ):
     """Get patient by ID"""
-    patient = db.query(Patient).filter(Patient.id == patient_id).first()
-    if not patient:
+    # A plain row is enough for the response; no ORM instance is hydrated
+    row = db.execute(select(*LIST_COLUMNS).where(Patient.id == patient_id)).first()
+    if not row:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Patient not found"
         )
-    return PatientResponse.from_orm_model(patient)
+    return _response_from_row(row)
 
 @router.post("", response_model=PatientResponse, status_code=status.HTTP_201_CREATED)
-async def create_patient(
+def create_patient(
     patient: PatientCreate,
     db: Session = Depends(get_db),
     # auth: dict = Depends(verify_token)
 ):
     """Create a new patient"""
-    # Check if CPF already exists
-    existing = db.query(Patient).filter(Patient.cpf == patient.cpf).first()
-    if existing:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="CPF already registered"
-        )
-    
     # Prepare data
     patient_data = patient.dict()
     
@@ -149,78 +282,306 @@ async def create_patient(
     
     # Convert gender enum to string
     patient_data['gender'] = patient.gender.value
+    # patient_data['created_by'] = auth.get("username")
     
-    # Create patient
-    db_patient = Patient(**patient_data)
-    # db_patient.created_by = auth.get("username")
+    if db.bind.dialect.name == "postgresql":
+        # One statement rejects a registered CPF (even one inserted concurrently)
+        # and returns the stored row, replacing the lookup, insert and refresh
+        stmt = (
+            postgresql.insert(Patient)
+            .values(**patient_data)
+            .on_conflict_do_nothing(index_elements=[Patient.cpf])
+            .returning(Patient)
+        )
+        db_patient = db.execute(stmt).scalar_one_or_none()
+    elif db.query(Patient.id).filter(Patient.cpf == patient.cpf).first():
+        db_patient = None
+    else:
+        db_patient = Patient(**patient_data)
+        db.add(db_patient)
+        db.flush()
     
-    db.add(db_patient)
+    if db_patient is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="CPF already registered"
+        )
+    
+    # Build the response before commit expires the instance and forces a reload
+    response = PatientResponse.model_validate(db_patient)
     db.commit()
-    db.refresh(db_patient)
+    anyio.from_thread.run(invalidate_patients)
     
-    logger.info(f"Patient created: {db_patient.id}")
+    logger.info("Patient created: %s", response.id)
     
-    return PatientResponse.from_orm_model(db_patient)
+    return response
 
 @router.put("/{patient_id}", response_model=PatientResponse)
-async def update_patient(
+def update_patient(
     patient_id: str,
     patient_update: PatientUpdate,
     db: Session = Depends(get_db),
     # auth: dict = Depends(verify_token)
 ):
     """Update patient information"""
-    patient = db.query(Patient).filter(Patient.id == patient_id).first()
+    update_data = patient_update.dict(exclude_unset=True)
+    
+    # dict() already turns nested models into plain dicts; only the enum needs unwrapping
+    if update_data.get("gender"):
+        update_data["gender"] = update_data["gender"].value
+    update_data["updated_at"] = datetime.utcnow()
+    
+    # UPDATE ... RETURNING applies the change and returns the row in one round trip,
+    # replacing the lookup and the refresh
+    stmt = (
+        update(Patient)
+        .where(Patient.id == patient_id)
+        .values(**update_data)
+        .returning(Patient)
+    )
+    patient = db.execute(stmt).scalar_one_or_none()
     if not patient:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Patient not found"
         )
     
-    update_data = patient_update.dict(exclude_unset=True)
-    
-    for field, value in update_data.items():
-        if field == "address" and value:
-            value = value.dict()
-        elif field == "emergency_contact" and value:
-            value = value.dict()
-        elif field == "insurance_info" and value:
-            value = value.dict()
-        elif field == "gender" and value:
-            value = value.value
-        
-        setattr(patient, field, value)
-    
-    patient.updated_at = datetime.utcnow()
-    
+    # Build the response before commit expires the instance and forces a reload
+    response = PatientResponse.model_validate(patient)
     db.commit()
-    db.refresh(patient)
+    anyio.from_thread.run(invalidate_patients)
     
-    logger.info(f"Patient updated: {patient_id}")
+    logger.info("Patient updated: %s", patient_id)
     
-    return PatientResponse.from_orm_model(patient)
+    return response
 
 @router.delete("/{patient_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_patient(
+def delete_patient(
     patient_id: str,
     db: Session = Depends(get_db),
     # auth: dict = Depends(verify_token)
 ):
     """Delete a patient"""
-    patient = db.query(Patient).filter(Patient.id == patient_id).first()
-    if not patient:
+    # One DELETE instead of loading the patient just to remove it
+    result = db.execute(delete(Patient).where(Patient.id == patient_id))
+    if not result.rowcount:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Patient not found"
         )
     
-    db.delete(patient)
     db.commit()
+    anyio.from_thread.run(invalidate_patients)
     
-    logger.info(f"Patient deleted: {patient_id}")
+    logger.info("Patient deleted: %s", patient_id)
     
     return None
 
+def _iter_import_items(fileobj):
+    """Stream patient entries from a JSON array or a Synthea bundle's 'entry' list"""
+    # Small uploads parse fastest in one orjson call; larger ones stream through ijson
+    size = fileobj.seek(0, 2)
+    fileobj.seek(0)
+    if size <= IMPORT_ORJSON_MAX_BYTES:
+        data = orjson.loads(fileobj.read())
+        if isinstance(data, dict) and 'entry' in data:
+            yield from data['entry']
+        elif isinstance(data, list):
+            yield from data
+        else:
+            raise ValueError("Invalid JSON format")
+        return
+    
+    # Peek at the first significant byte to pick the array or bundle layout
+    first = b""
+    while not first:
+        chunk = fileobj.read(1024)
+        if not chunk:
+            break
+        first = chunk.lstrip()[:1]
+    fileobj.seek(0)
+    
+    if first == b"[":
+        yield from ijson.items(fileobj, "item", use_float=True)
+    elif first == b"{":
+        found = False
+        for item in ijson.items(fileobj, "entry.item", use_float=True):
+            found = True
+            yield item
+        if not found:
+            # Tell an empty 'entry' list apart from a document without one
+            fileobj.seek(0)
+            if not any(
+                prefix == "" and event == "map_key" and value == "entry"
+                for prefix, event, value in ijson.parse(fileobj)
+            ):
+                raise ValueError("Invalid JSON format")
+    else:
+        # Raises ijson.JSONError for malformed or empty documents
+        for _ in ijson.parse(fileobj):
+            pass
+        raise ValueError("Invalid JSON format")
+
+def _insert_new_patients(db: Session, rows: list, seen_cpfs: set) -> int:
+    """Insert rows whose CPF is neither registered nor earlier in the import; returns the count"""
+    batch = []
+    for row in rows:
+        if row['cpf'] not in seen_cpfs:
+            seen_cpfs.add(row['cpf'])
+            batch.append(row)
+    if not batch:
+        return 0
+    
+    if db.bind.dialect.name == "postgresql":
+        # ON CONFLICT skips registered CPFs in the same statement, including ones
+        # inserted concurrently, so no lookup is needed
+        stmt = (
+            postgresql.insert(Patient)
+            .on_conflict_do_nothing(index_elements=[Patient.cpf])
+            .returning(Patient.id)
+        )
+        return len(db.execute(stmt, batch).all())
+    
+    # One IN query per batch finds the CPFs that are already registered
+    existing = {
+        cpf for (cpf,) in
+        db.query(Patient.cpf).filter(Patient.cpf.in_([row['cpf'] for row in batch]))
+    }
+    batch = [row for row in batch if row['cpf'] not in existing]
+    if batch:
+        db.execute(insert(Patient), batch)
+    return len(batch)
+
+def _fhir_to_dict(resource: dict) -> dict:
+    """Map a Synthea FHIR Patient resource to PatientCreate fields"""
+    # Each nested list is looked up once, and a uuid is only generated when a
+    # value is actually missing
+    names = resource.get('name')
+    name = names[0] if names else {}
+    given = name.get('given')
+    identifiers = resource.get('identifier')
+    telecoms = resource.get('telecom')
+    
+    return {
+        'name': f"{given[0] if given else ''} {name.get('family', '')}".strip(),
+        'cpf': (identifiers[0].get('value') if identifiers else None) or uuid.uuid4().hex[:11],
+        'birth_date': resource.get('birthDate', '2000-01-01'),
+        'gender': (resource.get('gender') or 'other')[0].upper(),
+        'email': f"{resource.get('id') or uuid.uuid4().hex}@example.com",
+        'phone': (telecoms[0].get('value') if telecoms else None) or '11999999999',
+    }
+
+def _item_to_row(item: dict) -> dict:
+    """Validate one import entry and convert it to a patients table row"""
+    # Extract patient data (adapt based on format)
+    if 'resource' in item:  # Synthea FHIR format
+        patient_data = _fhir_to_dict(item['resource'])
+    else:  # Custom format
+        patient_data = item
+    
+    # Validate and create patient
+    patient_create = PatientCreate(**patient_data)
+    
+    # Prepare data
+    db_patient_data = patient_create.dict()
+    
+    # Convert nested models
+    if patient_create.address:
+        db_patient_data['address'] = patient_create.address.dict()
+    if patient_create.emergency_contact:
+        db_patient_data['emergency_contact'] = patient_create.emergency_contact.dict()
+    if patient_create.insurance_info:
+        db_patient_data['insurance_info'] = patient_create.insurance_info.dict()
+    
+    # Convert gender
+    db_patient_data['gender'] = patient_create.gender.value
+    # db_patient_data['created_by'] = auth.get("username")
+    
+    return db_patient_data
+
+def _validate_chunk(items: list):
+    """Validate a chunk of import entries; returns (rows, error messages)"""
+    rows = []
+    errors = []
+    for item in items:
+        try:
+            rows.append(_item_to_row(item))
+        except Exception as e:
+            errors.append(str(e))
+    return rows, errors
+
+def _get_validation_pool() -> ProcessPoolExecutor:
+    """Create the import validation pool on first use"""
+    global _validation_pool
+    with _validation_pool_lock:
+        if _validation_pool is None:
+            _validation_pool = ProcessPoolExecutor(
+                max_workers=IMPORT_VALIDATION_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _validation_pool
+
+def shutdown_validation_pool():
+    """Stop the import validation processes, if any were started"""
+    global _validation_pool
+    with _validation_pool_lock:
+        if _validation_pool is not None:
+            _validation_pool.shutdown(wait=True, cancel_futures=True)
+            _validation_pool = None
+
+def _iter_validated_chunks(items):
+    """Yield (rows, errors) per chunk of entries, in upload order"""
+    chunks = iter(lambda: list(itertools.islice(items, IMPORT_VALIDATION_CHUNK)), [])
+    first = next(chunks, None)
+    second = next(chunks, None)
+    if second is None:
+        # A single chunk isn't worth the round trip to a worker process
+        if first:
+            yield _validate_chunk(first)
+        return
+    
+    # Validation is CPU-bound, so chunks fan out across processes; the number in
+    # flight is bounded so a large upload is still read incrementally
+    pool = _get_validation_pool()
+    pending = deque()
+    for chunk in itertools.chain((first, second), chunks):
+        pending.append(pool.submit(_validate_chunk, chunk))
+        if len(pending) >= IMPORT_MAX_PENDING_CHUNKS:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+def _import_patients_file(fileobj, db: Session) -> ImportResponse:
+    """Parse, validate and insert the patients of an uploaded JSON file"""
+    imported_count = 0
+    error_count = 0
+    error_details = []
+    rows = []
+    seen_cpfs = set()
+    
+    # Parse the upload incrementally so memory stays flat for large files
+    for chunk_rows, chunk_errors in _iter_validated_chunks(_iter_import_items(fileobj)):
+        error_count += len(chunk_errors)
+        error_details.extend(chunk_errors[:max(0, 10 - len(error_details))])
+        rows.extend(chunk_rows)
+        
+        # Insert valid patients in batches; the import still commits once,
+        # so a malformed file leaves nothing behind
+        if len(rows) >= IMPORT_BATCH_SIZE:
+            imported_count += _insert_new_patients(db, rows, seen_cpfs)
+            rows.clear()
+    
+    if rows:
+        imported_count += _insert_new_patients(db, rows, seen_cpfs)
+    db.commit()
+    
+    return ImportResponse(
+        message="Import completed",
+        imported=imported_count,
+        errors=error_count,
+        error_details=error_details
+    )
+
 @router.post("/import", response_model=ImportResponse)
 async def import_patients(
     file: UploadFile = File(...),
@@ -234,85 +595,25 @@ async def import_patients(
             detail="Only JSON files are supported"
         )
     
-    content = await file.read()
-    
     try:
-        data = json.loads(content)
-        
-        # Handle both array and object with 'entry' field (Synthea format)
-        if isinstance(data, dict) and 'entry' in data:
-            patients_data = data['entry']
-        elif isinstance(data, list):
-            patients_data = data
-        else:
-            raise ValueError("Invalid JSON format")
-        
-        imported_count = 0
-        errors = []
-        
-        for item in patients_data:
-            try:
-                # Extract patient data (adapt based on format)
-                if 'resource' in item:  # Synthea FHIR format
-                    resource = item['resource']
-                    patient_data = {
-                        'name': f"{resource.get('name', [{}])[0].get('given', [''])[0]} {resource.get('name', [{}])[0].get('family', '')}".strip(),
-                        'cpf': resource.get('identifier', [{}])[0].get('value', str(uuid.uuid4())[:11]),
-                        'birth_date': resource.get('birthDate', '2000-01-01'),
-                        'gender': resource.get('gender', 'other')[0].upper(),
-                        'email': f"{resource.get('id', uuid.uuid4())}@example.com",
-                        'phone': resource.get('telecom', [{}])[0].get('value', '11999999999'),
-                    }
-                else:  # Custom format
-                    patient_data = item
-                
-                # Validate and create patient
-                patient_create = PatientCreate(**patient_data)
-                
-                # Check if CPF already exists
-                existing = db.query(Patient).filter(Patient.cpf == patient_create.cpf).first()
-                if not existing:
-                    # Prepare data
-                    db_patient_data = patient_create.dict()
-                    
-                    # Convert nested models
-                    if patient_create.address:
-                        db_patient_data['address'] = patient_create.address.dict()
-                    if patient_create.emergency_contact:
-                        db_patient_data['emergency_contact'] = patient_create.emergency_contact.dict()
-                    if patient_create.insurance_info:
-                        db_patient_data['insurance_info'] = patient_create.insurance_info.dict()
-                    
-                    # Convert gender
-                    db_patient_data['gender'] = patient_create.gender.value
-                    
-                    db_patient = Patient(**db_patient_data)
-                    # db_patient.created_by = auth.get("username")
-                    
-                    db.add(db_patient)
-                    imported_count += 1
-                
-            except Exception as e:
-                errors.append(str(e))
-                continue
-        
-        db.commit()
-        
-        return ImportResponse(
-            message="Import completed",
-            imported=imported_count,
-            errors=len(errors),
-            error_details=errors[:10] if errors else []
-        )
-        
-    except json.JSONDecodeError:
+        # Parsing and inserts block, so run them on the threadpool instead of the event loop
+        async with _import_semaphore:
+            result = await anyio.to_thread.run_sync(_import_patients_file, file.file, db)
+    except (ijson.JSONError, orjson.JSONDecodeError):
+        db.rollback()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid JSON file"
         )
     except Exception as e:
-        logger.error(f"Import error: {str(e)}")
+        db.rollback()
+        logger.error("Import error: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Import failed: {str(e)}"
-        )
\ No newline at end of file
+        )
+    
+    if result.imported:
+        await invalidate_patients()
+    
+    return result
\ No newline at end of file
@@ -1,12 +1,25 @@
 """
 Pydantic schemas for patient service
 """
-from pydantic import BaseModel, EmailStr, Field, validator
+from pydantic import BaseModel, EmailStr, Field, computed_field, validator
 from typing import Optional, List, Dict
 from datetime import date, datetime
 from enum import Enum
 import re
 
+# Compiled once; the validators run for every row of an import
+_NON_DIGIT = re.compile(r'\D')
+_CEP_RE = re.compile(r'^\d{5}-?\d{3}$')
+
+def _normalize_phone(v: str) -> str:
+    """Strip formatting and the +55 country code from a phone number"""
+    phone = _NON_DIGIT.sub('', v)
+    if phone.startswith('55') and len(phone) > 11:
+        phone = phone[2:]
+    if len(phone) < 10 or len(phone) > 11:
+        raise ValueError('Telefone inválido')
+    return phone
+
 class Gender(str, Enum):
     """Gender enum"""
     MALE = "M"
@@ -25,7 +38,7 @@ class Address(BaseModel):
     
     @validator('zip_code')
     def validate_zip_code(cls, v):
-        if not re.match(r'^\d{5}-?\d{3}$', v):
+        if not _CEP_RE.match(v):
             raise ValueError('CEP inválido')
         return v.replace('-', '')
 
@@ -75,14 +88,7 @@ class PatientBase(BaseModel):
     @validator('phone')
     def validate_phone(cls, v):
         if v:
-            # Remove all non-numeric characters
-            phone = re.sub(r'\D', '', v)
-            # Remove country code if present
-            if phone.startswith('55') and len(phone) > 11:
-                phone = phone[2:]
-            if len(phone) < 10 or len(phone) > 11:
-                raise ValueError('Telefone inválido')
-            return phone
+            return _normalize_phone(v)
         return v
 
 class PatientCreate(PatientBase):
@@ -92,7 +98,7 @@ class PatientCreate(PatientBase):
     @validator('cpf')
     def validate_cpf(cls, v):
         # Remove non-numeric characters
-        cpf = re.sub(r'\D', '', v)
+        cpf = _NON_DIGIT.sub('', v)
         
         if len(cpf) != 11:
             raise ValueError('CPF deve ter 11 dígitos')
@@ -121,12 +127,7 @@ class PatientUpdate(BaseModel):
     @validator('phone')
     def validate_phone(cls, v):
         if v:
-            phone = re.sub(r'\D', '', v)
-            if phone.startswith('55') and len(phone) > 11:
-                phone = phone[2:]
-            if len(phone) < 10 or len(phone) > 11:
-                raise ValueError('Telefone inválido')
-            return phone
+            return _normalize_phone(v)
         return v
 
 class PatientResponse(BaseModel):
@@ -136,7 +137,6 @@ class PatientResponse(BaseModel):
     cpf: str
     birth_date: date
     gender: str
-    age: int
     email: Optional[str]
     phone: Optional[str]
     address: Optional[Dict]
@@ -149,44 +149,37 @@ class PatientResponse(BaseModel):
     created_at: datetime
     updated_at: datetime
     
+    @validator('id', pre=True)
+    def stringify_id(cls, v):
+        # ORM rows carry a UUID; the API exposes it as a string
+        return str(v)
+    
+    @validator('medical_conditions', 'medications', 'allergies', pre=True)
+    def default_empty_list(cls, v):
+        return v or []
+    
+    @computed_field
+    @property
+    def age(self) -> int:
+        """Age in whole years, derived from birth_date when serialized"""
+        return self.calculate_age(self.birth_date)
+    
     @staticmethod
     def calculate_age(birth_date: date) -> int:
         today = date.today()
         return today.year - birth_date.year - ((today.month, today.day) < (birth_date.month, birth_date.day))
     
-    @classmethod
-    def from_orm_model(cls, patient):
-        """Create response from ORM model"""
-        return cls(
-            id=str(patient.id),
-            name=patient.name,
-            cpf=patient.cpf,
-            birth_date=patient.birth_date,
-            gender=patient.gender,
-            age=cls.calculate_age(patient.birth_date),
-            email=patient.email,
-            phone=patient.phone,
-            address=patient.address,
-            medical_conditions=patient.medical_conditions or [],
-            medications=patient.medications or [],
-            allergies=patient.allergies or [],
-            emergency_contact=patient.emergency_contact,
-            insurance_info=patient.insurance_info,
-            notes=patient.notes,
-            created_at=patient.created_at,
-            updated_at=patient.updated_at
-        )
-    
     class Config:
         from_attributes = True
 
 class PaginatedResponse(BaseModel):
     """Schema for paginated response"""
     items: List[PatientResponse]
-    total: int
+    total: Optional[int] = None  # Not computed when paginating with a cursor
     page: int
     size: int
-    pages: int
+    pages: Optional[int] = None
+    next_cursor: Optional[str] = None
 
 class ImportResponse(BaseModel):
     """Schema for import response"""
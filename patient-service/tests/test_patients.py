@@ -3,8 +3,9 @@ Tests for Patient Service
 """
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
 from datetime import date, datetime
 import sys
 import os
@@ -12,24 +13,62 @@ import os
 # Add parent directory to path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from patient_service.main import app, get_db, Base, Patient
+# Keep responses out of Redis so each test sees its own data
+os.environ.setdefault("CACHE_ENABLED", "false")
 
-# Test database
-SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
-TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+from main import app
+from database import Base, get_db, get_db_ro
+from models.patient import Patient
+from routers.patients import IMPORT_VALIDATION_CHUNK, shutdown_validation_pool
 
-Base.metadata.create_all(bind=engine)
+# Test database: one in-memory SQLite database behind a single shared connection
+SQLALCHEMY_DATABASE_URL = "sqlite://"
+engine = create_engine(
+    SQLALCHEMY_DATABASE_URL,
+    connect_args={"check_same_thread": False},
+    poolclass=StaticPool
+)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False)
 
-def override_get_db():
-    try:
-        db = TestingSessionLocal()
-        yield db
-    finally:
-        db.close()
+# pysqlite handles transactions itself; hand BEGIN back to SQLAlchemy so the
+# per-test SAVEPOINTs below behave
+@event.listens_for(engine, "connect")
+def do_connect(dbapi_connection, connection_record):
+    dbapi_connection.isolation_level = None
 
-app.dependency_overrides[get_db] = override_get_db
+@event.listens_for(engine, "begin")
+def do_begin(conn):
+    conn.exec_driver_sql("BEGIN")
 
+@pytest.fixture(scope="session", autouse=True)
+def _schema():
+    """Create the tables once per test session"""
+    Base.metadata.create_all(bind=engine)
+    yield
+    Base.metadata.drop_all(bind=engine)
+
+@pytest.fixture(autouse=True)
+def db_session(_schema):
+    """Give each test a session whose changes are rolled back afterwards"""
+    connection = engine.connect()
+    transaction = connection.begin()
+    # The endpoints' commits only release SAVEPOINTs inside the outer transaction
+    session = TestingSessionLocal(bind=connection, join_transaction_mode="create_savepoint")
+    
+    def override_get_db():
+        yield session
+    
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_db_ro] = override_get_db
+    yield session
+    
+    app.dependency_overrides.pop(get_db, None)
+    app.dependency_overrides.pop(get_db_ro, None)
+    session.close()
+    transaction.rollback()
+    connection.close()
+
+# One client for the module; the startup hooks (pool warm-up) aren't needed here
 client = TestClient(app)
 
 @pytest.fixture
@@ -107,6 +146,36 @@ class TestPatientEndpoints:
         assert "total" in data
         assert len(data["items"]) <= 3
     
+    def test_list_patients_cursor(self, sample_patient):
+        """Test walking the patient list with next_cursor"""
+        for i in range(5):
+            patient = sample_patient.copy()
+            patient["cpf"] = f"5555555550{i}"
+            patient["name"] = f"Patient {i}"
+            client.post("/patients", json=patient)
+        all_ids = [p["id"] for p in client.get("/patients?size=100").json()["items"]]
+        
+        first = client.get("/patients?size=3").json()
+        assert first["total"] == 5
+        assert first["next_cursor"]
+        
+        second = client.get(f"/patients?size=3&after={first['next_cursor']}")
+        assert second.status_code == 200
+        data = second.json()
+        assert data["total"] is None
+        assert data["pages"] is None
+        assert data["next_cursor"] is None
+        
+        # The two pages cover every patient once, in list order
+        ids = [p["id"] for p in first["items"]] + [p["id"] for p in data["items"]]
+        assert ids == all_ids
+    
+    def test_list_patients_invalid_cursor(self):
+        """Test that a malformed cursor is rejected"""
+        response = client.get("/patients?after=not-a-cursor")
+        assert response.status_code == 400
+        assert response.json()["detail"] == "Invalid cursor"
+    
     def test_update_patient(self, sample_patient):
         """Test updating patient information"""
         # Create patient
@@ -218,6 +287,58 @@ class TestPatientImport:
         assert response.status_code == 200
         data = response.json()
         assert data["imported"] == 2
+    
+    def test_import_skips_duplicate_cpfs(self, sample_patient, db_session):
+        """Test that repeated and already registered CPFs are imported once"""
+        client.post("/patients", json=sample_patient)
+        
+        import_data = [
+            {"name": "Maria Santos", "cpf": "44444444440", "birth_date": "1985-05-15", "gender": "F"},
+            {"name": "Maria Santos", "cpf": "44444444440", "birth_date": "1985-05-15", "gender": "F"},
+            {"name": "João Silva", "cpf": sample_patient["cpf"], "birth_date": "1990-01-01", "gender": "M"},
+            {"name": "Pedro Oliveira", "cpf": "44444444441", "birth_date": "1975-10-20", "gender": "M"}
+        ]
+        
+        import json
+        import io
+        
+        response = client.post(
+            "/patients/import",
+            files={"file": ("patients.json", io.BytesIO(json.dumps(import_data).encode()), "application/json")}
+        )
+        assert response.status_code == 200
+        data = response.json()
+        assert data["imported"] == 2
+        assert data["errors"] == 0
+        
+        for cpf in ("44444444440", "44444444441", sample_patient["cpf"]):
+            assert db_session.query(Patient).filter(Patient.cpf == cpf).count() == 1
+    
+    def test_import_large_file(self, db_session):
+        """Test an import spanning several validation chunks"""
+        count = IMPORT_VALIDATION_CHUNK + 100
+        import_data = [
+            {"name": f"Paciente {i}", "cpf": f"{i:011d}", "birth_date": "1980-01-01", "gender": "F"}
+            for i in range(1, count + 1)
+        ]
+        # One invalid entry past the first chunk is reported, not imported
+        import_data.append({"name": "Inválido", "cpf": "123", "birth_date": "1980-01-01", "gender": "F"})
+        
+        import json
+        import io
+        
+        try:
+            response = client.post(
+                "/patients/import",
+                files={"file": ("patients.json", io.BytesIO(json.dumps(import_data).encode()), "application/json")}
+            )
+        finally:
+            shutdown_validation_pool()
+        assert response.status_code == 200
+        data = response.json()
+        assert data["imported"] == count
+        assert data["errors"] == 1
+        assert db_session.query(Patient).count() == count
 
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
\ No newline at end of file
@@ -22,7 +22,7 @@ async def verify_token(authorization: str = None):
     
     async with httpx.AsyncClient() as client:
         try:
-            response = await client.post(
+            response = await client.get(
                 f"{AUTH_SERVICE_URL}/auth/verify",
                 params={"token": token}
             )
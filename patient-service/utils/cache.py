@@ -0,0 +1,56 @@
+"""
+Redis cache helpers for patient service
+"""
+import os
+import logging
+from typing import Optional
+import redis.asyncio as redis
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
+CACHE_ENABLED = os.getenv("CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+
+STATS_CACHE_KEY = "patients:stats:v1"
+STATS_CACHE_TTL = 120
+
+# Bumped on every patient write; search-service keys its suggestion cache on it
+PATIENTS_VERSION_KEY = "patients:version"
+
+# Short timeouts so an unreachable Redis degrades to cache misses instead of stalling requests
+_client = redis.from_url(
+    REDIS_URL,
+    socket_timeout=0.5,
+    socket_connect_timeout=0.5
+) if CACHE_ENABLED else None
+
+async def cache_get(key: str) -> Optional[bytes]:
+    """Read a cached value; cache failures count as misses"""
+    if _client is None:
+        return None
+    try:
+        return await _client.get(key)
+    except redis.RedisError as e:
+        logger.warning("Cache read failed for %s: %s", key, e)
+        return None
+
+async def cache_set(key: str, value: bytes, ttl: int):
+    """Store a value with a TTL in seconds"""
+    if _client is None:
+        return
+    try:
+        await _client.set(key, value, ex=ttl)
+    except redis.RedisError as e:
+        logger.warning("Cache write failed for %s: %s", key, e)
+
+async def invalidate_patients():
+    """Drop the cached stats and bump the patient data version after a write"""
+    if _client is None:
+        return
+    try:
+        async with _client.pipeline(transaction=False) as pipe:
+            pipe.delete(STATS_CACHE_KEY)
+            pipe.incr(PATIENTS_VERSION_KEY)
+            await pipe.execute()
+    except redis.RedisError as e:
+        logger.warning("Cache invalidation failed for patient writes: %s", e)
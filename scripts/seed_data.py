@@ -11,11 +11,16 @@ from faker import Faker
 from datetime import datetime, date, timedelta
 import random
 import json
-from sqlalchemy import create_engine
+import csv
+import io
+import orjson
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+from sqlalchemy import create_engine, insert, select, text
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy import Column, String, Date, DateTime, Text, JSON, Boolean
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import Column, String, Date, DateTime, Text, JSON, Boolean, Index, DDL, event
+from sqlalchemy.dialects.postgresql import UUID, JSONB
 import uuid
 
 # Database connection
@@ -24,32 +29,74 @@ engine = create_engine(DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# Same column type as the services' models: JSONB on Postgres
+JSONType = JSON().with_variant(JSONB(), "postgresql")
+
 # Define models locally since we're running this script independently
 class Patient(Base):
     """Patient model"""
     __tablename__ = "patients"
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    name = Column(String, nullable=False, index=True)
+    name = Column(String, nullable=False)
     cpf = Column(String(11), unique=True, nullable=False, index=True)
     birth_date = Column(Date, nullable=False)
     gender = Column(String(1), nullable=False)
     email = Column(String, nullable=True)
     phone = Column(String, nullable=True)
-    address = Column(JSON, nullable=True)
-    medical_conditions = Column(JSON, default=list)
-    medications = Column(JSON, default=list)
-    allergies = Column(JSON, default=list)
-    emergency_contact = Column(JSON, nullable=True)
-    insurance_info = Column(JSON, nullable=True)
+    address = Column(JSONType, nullable=True)
+    medical_conditions = Column(JSONType, default=list)
+    medications = Column(JSONType, default=list)
+    allergies = Column(JSONType, default=list)
+    emergency_contact = Column(JSONType, nullable=True)
+    insurance_info = Column(JSONType, nullable=True)
     notes = Column(Text, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     created_by = Column(String, nullable=True)
+    
+    __table_args__ = (
+        # Keyset pagination walks patients newest first
+        Index("ix_patients_created_at_id", created_at.desc(), id.desc()),
+        # Search keyset pagination by name or birth date, id breaking ties
+        Index("ix_patients_name_id", name, id),
+        Index("ix_patients_birth_date_id", birth_date, id),
+        # LIKE 'digits%' prefix search on CPF, whatever the database collation
+        Index("ix_patients_cpf_prefix", cpf, postgresql_ops={"cpf": "text_pattern_ops"}),
+        # Containment (@>) lookups on the medical lists
+        Index(
+            "ix_patients_medical_conditions_gin", medical_conditions,
+            postgresql_using="gin", postgresql_ops={"medical_conditions": "jsonb_path_ops"}
+        ),
+        Index(
+            "ix_patients_medications_gin", medications,
+            postgresql_using="gin", postgresql_ops={"medications": "jsonb_path_ops"}
+        ),
+        Index(
+            "ix_patients_allergies_gin", allergies,
+            postgresql_using="gin", postgresql_ops={"allergies": "jsonb_path_ops"}
+        ),
+        # Trigram indexes serve the ILIKE '%term%' search filters (needs pg_trgm)
+        Index("ix_patients_name_trgm", name, postgresql_using="gin", postgresql_ops={"name": "gin_trgm_ops"}),
+        Index("ix_patients_cpf_trgm", cpf, postgresql_using="gin", postgresql_ops={"cpf": "gin_trgm_ops"}),
+        Index("ix_patients_email_trgm", email, postgresql_using="gin", postgresql_ops={"email": "gin_trgm_ops"}),
+        Index("ix_patients_notes_trgm", notes, postgresql_using="gin", postgresql_ops={"notes": "gin_trgm_ops"}),
+    )
+
+# Fresh databases (e.g. test DBs) need pg_trgm before create_all builds the
+# trigram indexes; the extension must be available to the Postgres server
+event.listen(
+    Patient.__table__, "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql")
+)
 
 class User(Base):
     """User model for authentication"""
     __tablename__ = "users"
+    __table_args__ = (
+        # Covers the login lookup by username together with the active flag
+        Index("ix_users_username_active", "username", "is_active"),
+    )
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     email = Column(String, unique=True, index=True, nullable=False)
@@ -64,6 +111,21 @@ class User(Base):
 # Create tables if they don't exist
 Base.metadata.create_all(bind=engine)
 
+# Patients generated and loaded per COPY statement, and per generation task
+SEED_CHUNK_SIZE = 10_000
+SEED_BATCH_SIZE = 1_000
+
+# Column order of the COPY statement
+COPY_COLUMNS = (
+    "id", "name", "cpf", "birth_date", "gender", "email", "phone", "address",
+    "medical_conditions", "medications", "allergies", "emergency_contact",
+    "insurance_info", "notes", "created_at", "updated_at"
+)
+JSON_COLUMNS = {
+    "address", "medical_conditions", "medications",
+    "allergies", "emergency_contact", "insurance_info"
+}
+
 # Initialize Faker for Brazilian Portuguese
 fake = Faker('pt_BR')
 
@@ -88,11 +150,15 @@ ALLERGIES = [
     "Glúten", "Ovo", "Soja", "Pólen", "Ácaros"
 ]
 
+# Must match auth-service/utils/security.py so seeded users verify without the legacy fallback
+PREHASH_PREFIX = "sha256$"
+BCRYPT_COST = int(os.getenv("BCRYPT_COST", "12"))
+
 def get_password_hash(password: str) -> str:
-    """Hash a password using bcrypt"""
-    from passlib.context import CryptContext
-    pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-    return pwd_context.hash(password)
+    """Hash a password the same way the auth service does"""
+    import bcrypt
+    prehashed = hashlib.sha256(password.encode()).hexdigest().encode()
+    return PREHASH_PREFIX + bcrypt.hashpw(prehashed, bcrypt.gensalt(rounds=BCRYPT_COST)).decode()
 
 def generate_cpf():
     """Generate a valid-looking CPF (for testing only)"""
@@ -104,106 +170,182 @@ def generate_phone():
     prefix = random.choice(['9', '8'])
     return f"{ddd}9{prefix}{random.randint(1000000, 9999999)}"
 
+ADDRESS_COMPLEMENTS = ["", "Apto 101", "Casa 2", "Bloco B"]
+EMERGENCY_RELATIONSHIPS = ["Cônjuge", "Filho(a)", "Pai/Mãe", "Irmão(ã)", "Amigo(a)"]
+# Ages 18 to 90 in days, i.e. age*365 plus a day within that year
+BIRTH_OFFSET_DAYS = range(18 * 365, 91 * 365)
+# Sizes of the per-batch pools drawn from Faker providers with few distinct values
+EMAIL_DOMAIN_POOL_SIZE = 128
+STATE_POOL_SIZE = 128
+NEIGHBORHOOD_POOL_SIZE = 256
+
+def generate_patient_rows(count):
+    """Generate the column values of count sample patients"""
+    today = date.today()
+    now = datetime.utcnow()
+    
+    # Draw the plain random columns for the whole batch up front; only the
+    # locale-specific strings still come from Faker row by row
+    genders = random.choices(("M", "F"), k=count)
+    birth_offsets = random.choices(BIRTH_OFFSET_DAYS, k=count)
+    street_numbers = random.choices(range(1, 10000), k=count)
+    complements = random.choices(ADDRESS_COMPLEMENTS, k=count)
+    condition_counts = random.choices(range(5), k=count)
+    medication_counts = random.choices(range(6), k=count)
+    allergy_counts = random.choices(range(4), k=count)
+    relationships = random.choices(EMERGENCY_RELATIONSHIPS, k=count)
+    
+    # Providers that only pick from short lists are sampled into small pools
+    # once, skipping Faker's provider dispatch on every row
+    email_domains = random.choices([fake.free_email_domain() for _ in range(EMAIL_DOMAIN_POOL_SIZE)], k=count)
+    states = random.choices([fake.estado_sigla() for _ in range(STATE_POOL_SIZE)], k=count)
+    neighborhoods = random.choices([fake.bairro() for _ in range(NEIGHBORHOOD_POOL_SIZE)], k=count)
+    insured = [random.random() < 0.7 for _ in range(count)]
+    with_notes = [random.random() < 0.3 for _ in range(count)]
+    created_offsets = random.choices(range(366), k=count)
+    
+    rows = []
+    for i in range(count):
+        # Generate basic info
+        gender = genders[i]
+        if gender == 'M':
+            first_name = fake.first_name_male()
+        else:
+            first_name = fake.first_name_female()
+        
+        last_name = fake.last_name()
+        
+        # Generate address
+        address = {
+            "street": fake.street_name(),
+            "number": str(street_numbers[i]),
+            "complement": complements[i],
+            "neighborhood": neighborhoods[i],
+            "city": fake.city(),
+            "state": states[i],
+            "zip_code": fake.postcode().replace('-', '')
+        }
+        
+        # Generate emergency contact
+        emergency_contact = {
+            "name": fake.name(),
+            "relationship": relationships[i],
+            "phone": generate_phone(),
+            "email": fake.email()
+        }
+        
+        # Generate insurance info (70% chance of having insurance)
+        insurance_info = None
+        if insured[i]:
+            insurance_info = {
+                "provider": random.choice(["Unimed", "Amil", "SulAmérica", "Bradesco Saúde", "Porto Seguro", "SUS"]),
+                "plan": random.choice(["Básico", "Standard", "Premium", "Gold", "Platinum"]),
+                "number": str(random.randint(100000000, 999999999)),
+                "validity": (today + timedelta(days=random.randint(30, 730))).isoformat()
+            }
+        
+        rows.append({
+            "id": uuid.uuid4(),
+            "name": f"{first_name} {last_name}",
+            "cpf": generate_cpf(),
+            "birth_date": today - timedelta(days=birth_offsets[i]),
+            "gender": gender,
+            "email": f"{first_name.lower()}.{last_name.lower()}@{email_domains[i]}",
+            "phone": generate_phone(),
+            "address": address,
+            "medical_conditions": random.sample(MEDICAL_CONDITIONS, condition_counts[i]),
+            "medications": random.sample(MEDICATIONS, medication_counts[i]),
+            "allergies": random.sample(ALLERGIES, allergy_counts[i]),
+            "emergency_contact": emergency_contact,
+            "insurance_info": insurance_info,
+            "notes": fake.text(max_nb_chars=200) if with_notes[i] else None,
+            "created_at": now - timedelta(days=created_offsets[i]),
+            "updated_at": now
+        })
+    return rows
+
+def copy_patient_rows(cursor, rows):
+    """Stream rows into the patients table with a single COPY"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([
+            # JSON columns are always encoded, so None becomes JSON null like an ORM insert
+            json.dumps(row[column], ensure_ascii=False) if column in JSON_COLUMNS
+            # Empty unquoted fields are NULL in COPY's CSV format
+            else row[column]
+            for column in COPY_COLUMNS
+        ])
+    buffer.seek(0)
+    cursor.copy_expert(
+        f"COPY patients ({', '.join(COPY_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+        buffer
+    )
+
+def _init_generator_worker():
+    """Forget pooled connections inherited from the parent without closing them"""
+    engine.dispose(close=False)
+
+def generate_patient_batch(seed, count):
+    """Generate count patients from a fresh seed (runs in a worker process)"""
+    # Forked workers start with identical random/Faker state; reseeding keeps batches distinct
+    random.seed(seed)
+    fake.seed_instance(seed)
+    return generate_patient_rows(count)
+
+def generate_patient_chunks(n, batch_map=map, existing_cpfs=()):
+    """Yield the n sample patients in chunks of SEED_CHUNK_SIZE rows
+    
+    Each chunk is generated as SEED_BATCH_SIZE batches through batch_map, e.g.
+    a process pool's map to use every core. Rows whose CPF is in existing_cpfs
+    are skipped, so the load never collides with patients already stored.
+    """
+    seen_cpfs = set(existing_cpfs)
+    for start in range(0, n, SEED_CHUNK_SIZE):
+        chunk_size = min(SEED_CHUNK_SIZE, n - start)
+        counts = [min(SEED_BATCH_SIZE, chunk_size - i) for i in range(0, chunk_size, SEED_BATCH_SIZE)]
+        seeds = [random.getrandbits(64) for _ in counts]
+        
+        rows = []
+        for batch in batch_map(generate_patient_batch, seeds, counts):
+            for row in batch:
+                # Random CPFs can repeat, and one duplicate would abort the whole load
+                if row["cpf"] in seen_cpfs:
+                    continue
+                seen_cpfs.add(row["cpf"])
+                rows.append(row)
+        yield rows
+
 def create_sample_patients(n=50):
     """Create n sample patients"""
-    db = SessionLocal()
-    patients_created = 0
-    
     print(f"Creating {n} sample patients...")
     
-    for i in range(n):
-        try:
-            # Generate basic info
-            gender = random.choice(['M', 'F'])
-            if gender == 'M':
-                first_name = fake.first_name_male()
-            else:
-                first_name = fake.first_name_female()
-            
-            last_name = fake.last_name()
-            full_name = f"{first_name} {last_name}"
-            
-            # Generate birth date (ages between 18 and 90)
-            age = random.randint(18, 90)
-            birth_date = date.today() - timedelta(days=age*365 + random.randint(0, 364))
-            
-            # Generate contact info
-            email = f"{first_name.lower()}.{last_name.lower()}@{fake.free_email_domain()}"
-            phone = generate_phone()
-            
-            # Generate address
-            address = {
-                "street": fake.street_name(),
-                "number": str(random.randint(1, 9999)),
-                "complement": random.choice(["", "Apto 101", "Casa 2", "Bloco B"]),
-                "neighborhood": fake.bairro(),
-                "city": fake.city(),
-                "state": fake.estado_sigla(),
-                "zip_code": fake.postcode().replace('-', '')
-            }
-            
-            # Generate medical info
-            num_conditions = random.randint(0, 4)
-            medical_conditions = random.sample(MEDICAL_CONDITIONS, min(num_conditions, len(MEDICAL_CONDITIONS)))
-            
-            num_medications = random.randint(0, 5)
-            medications = random.sample(MEDICATIONS, min(num_medications, len(MEDICATIONS)))
-            
-            num_allergies = random.randint(0, 3)
-            allergies = random.sample(ALLERGIES, min(num_allergies, len(ALLERGIES)))
-            
-            # Generate emergency contact
-            emergency_contact = {
-                "name": fake.name(),
-                "relationship": random.choice(["Cônjuge", "Filho(a)", "Pai/Mãe", "Irmão(ã)", "Amigo(a)"]),
-                "phone": generate_phone(),
-                "email": fake.email()
-            }
-            
-            # Generate insurance info (70% chance of having insurance)
-            insurance_info = None
-            if random.random() < 0.7:
-                insurance_info = {
-                    "provider": random.choice(["Unimed", "Amil", "SulAmérica", "Bradesco Saúde", "Porto Seguro", "SUS"]),
-                    "plan": random.choice(["Básico", "Standard", "Premium", "Gold", "Platinum"]),
-                    "number": str(random.randint(100000000, 999999999)),
-                    "validity": (date.today() + timedelta(days=random.randint(30, 730))).isoformat()
-                }
-            
-            # Create patient
-            patient = Patient(
-                id=uuid.uuid4(),
-                name=full_name,
-                cpf=generate_cpf(),
-                birth_date=birth_date,
-                gender=gender,
-                email=email,
-                phone=phone,
-                address=address,
-                medical_conditions=medical_conditions,
-                medications=medications,
-                allergies=allergies,
-                emergency_contact=emergency_contact,
-                insurance_info=insurance_info,
-                notes=fake.text(max_nb_chars=200) if random.random() < 0.3 else None,
-                created_at=datetime.utcnow() - timedelta(days=random.randint(0, 365)),
-                updated_at=datetime.utcnow()
-            )
-            
-            db.add(patient)
-            patients_created += 1
-            
-            if (i + 1) % 10 == 0:
-                db.commit()
-                print(f"Created {i + 1} patients...")
-                
-        except Exception as e:
-            print(f"Error creating patient {i}: {e}")
-            db.rollback()
-            continue
+    # Faker generation is CPU-bound; spread it over processes when there is enough of it
+    executor = None
+    if n > SEED_BATCH_SIZE:
+        executor = ProcessPoolExecutor(max_workers=os.cpu_count(), initializer=_init_generator_worker)
     
-    db.commit()
-    db.close()
+    patients_created = 0
+    try:
+        # One transaction for the whole load; chunks keep memory bounded
+        with engine.begin() as conn:
+            if engine.dialect.name == "postgresql":
+                # Seed data can be regenerated, so the commit needn't wait for the WAL flush
+                conn.exec_driver_sql("SET LOCAL synchronous_commit = OFF")
+            # A CPF already in the table would fail the unique index and roll back every chunk
+            existing_cpfs = set(conn.execute(select(Patient.cpf)).scalars())
+            chunks = generate_patient_chunks(n, executor.map if executor else map, existing_cpfs)
+            for rows in chunks:
+                if engine.dialect.name == "postgresql":
+                    # COPY runs on the DB-API cursor, inside the same transaction
+                    copy_patient_rows(conn.connection.cursor(), rows)
+                else:
+                    conn.execute(insert(Patient), rows)
+                patients_created += len(rows)
+                print(f"Created {patients_created} patients...")
+    finally:
+        if executor:
+            executor.shutdown()
     
     print(f"Successfully created {patients_created} patients!")
     return patients_created
@@ -238,71 +380,86 @@ def create_test_users():
     
     print("Creating test users...")
     
+    # One lookup for the accounts that already exist, then one multi-row INSERT
+    existing = {
+        username for (username,) in
+        db.query(User.username).filter(User.username.in_([u["username"] for u in test_users]))
+    }
+    
+    pending = []
     for user_data in test_users:
-        try:
-            # Check if user already exists
-            existing = db.query(User).filter(User.username == user_data["username"]).first()
-            if existing:
-                print(f"User {user_data['username']} already exists, skipping...")
-                continue
-            
-            user = User(
-                id=uuid.uuid4(),
-                email=user_data["email"],
-                username=user_data["username"],
-                full_name=user_data["full_name"],
-                hashed_password=get_password_hash(user_data["password"]),
-                is_admin=user_data["is_admin"],
-                is_active=True
-            )
-            
-            db.add(user)
-            print(f"Created user: {user_data['username']}")
-            
-        except Exception as e:
-            print(f"Error creating user {user_data['username']}: {e}")
-            db.rollback()
+        if user_data["username"] in existing:
+            print(f"User {user_data['username']} already exists, skipping...")
             continue
+        pending.append(user_data)
     
-    db.commit()
-    db.close()
+    # bcrypt is CPU-bound, so hash the passwords on one process per core
+    passwords = [user_data["password"] for user_data in pending]
+    if len(passwords) > 1:
+        with ProcessPoolExecutor(max_workers=min(len(passwords), os.cpu_count() or 1)) as executor:
+            hashes = list(executor.map(get_password_hash, passwords))
+    else:
+        hashes = [get_password_hash(password) for password in passwords]
+    
+    new_users = [
+        {
+            "id": uuid.uuid4(),
+            "email": user_data["email"],
+            "username": user_data["username"],
+            "full_name": user_data["full_name"],
+            "hashed_password": hashed_password,
+            "is_admin": user_data["is_admin"],
+            "is_active": True
+        }
+        for user_data, hashed_password in zip(pending, hashes)
+    ]
+    
+    try:
+        if engine.dialect.name == "postgresql":
+            # Same as the patient load: don't wait for the WAL flush at commit
+            db.execute(text("SET LOCAL synchronous_commit = OFF"))
+        if new_users:
+            db.execute(insert(User), new_users)
+        db.commit()
+        for user in new_users:
+            print(f"Created user: {user['username']}")
+    except Exception as e:
+        print(f"Error creating test users: {e}")
+        db.rollback()
+    finally:
+        db.close()
     
     print("Test users created successfully!")
     print("\nYou can now login with:")
     for user in test_users:
         print(f"  Username: {user['username']}, Password: {user['password']}")
 
-def export_sample_data():
-    """Export sample data to JSON file for import testing"""
+def export_sample_data(limit=10):
+    """Export sample data to JSON file for import testing (limit=None exports everyone)"""
     db = SessionLocal()
     
     # Create data directory if it doesn't exist
     os.makedirs('data', exist_ok=True)
     
-    # Get first 10 patients
-    patients = db.query(Patient).limit(10).all()
-    
-    export_data = []
-    for patient in patients:
-        export_data.append({
-            "name": patient.name,
-            "cpf": patient.cpf,
-            "birth_date": patient.birth_date.isoformat(),
-            "gender": patient.gender,
-            "email": patient.email,
-            "phone": patient.phone,
-            "address": patient.address,
-            "medical_conditions": patient.medical_conditions,
-            "medications": patient.medications,
-            "allergies": patient.allergies
-        })
+    # Only the fields the import endpoint reads, streamed in batches of rows
+    stmt = select(
+        Patient.name, Patient.cpf, Patient.birth_date, Patient.gender, Patient.email,
+        Patient.phone, Patient.address, Patient.medical_conditions,
+        Patient.medications, Patient.allergies
+    ).limit(limit)
     
-    # Save to file
-    with open('data/sample_patients.json', 'w', encoding='utf-8') as f:
-        json.dump(export_data, f, ensure_ascii=False, indent=2)
+    # Write the JSON array element by element instead of building it in memory
+    exported = 0
+    with open('data/sample_patients.json', 'wb') as f:
+        f.write(b"[")
+        for row in db.execute(stmt).yield_per(1000):
+            f.write(b",\n" if exported else b"\n")
+            f.write(orjson.dumps(dict(row._mapping)))
+            exported += 1
+        f.write(b"\n]\n")
     
     db.close()
-    print(f"Exported {len(export_data)} patients to data/sample_patients.json")
+    print(f"Exported {exported} patients to data/sample_patients.json")
 
 if __name__ == "__main__":
     import argparse
@@ -311,6 +468,7 @@ if __name__ == "__main__":
     parser.add_argument("--patients", type=int, default=50, help="Number of patients to create")
     parser.add_argument("--users", action="store_true", help="Create test users")
     parser.add_argument("--export", action="store_true", help="Export sample data to JSON")
+    parser.add_argument("--export-limit", type=int, default=10, help="Patients to export (0 for all)")
     parser.add_argument("--all", action="store_true", help="Do everything")
     
     args = parser.parse_args()
@@ -322,7 +480,7 @@ if __name__ == "__main__":
         create_sample_patients(args.patients)
     
     if args.all or args.export:
-        export_sample_data()
+        export_sample_data(args.export_limit or None)
     
     if not any([args.all, args.users, args.patients > 0, args.export]):
         print("No action specified. Use --help for options.")
@@ -3,18 +3,35 @@ Search Service - Main Application
 """
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 import logging
+import os
+import sys
+import orjson
 import uvicorn
 
 from database import engine, Base
 from routers import search as search_router
+from utils.auth import close_auth_client
 
 # Logging configuration
-logging.basicConfig(
-    level=logging.INFO,
-    format='{"time": "%(asctime)s", "level": "%(levelname)s", "message": "%(message)s", "service": "search"}',
-    datefmt='%Y-%m-%d %H:%M:%S'
-)
+class JSONFormatter(logging.Formatter):
+    """Render each log record as one JSON line encoded by orjson"""
+    
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record, '%Y-%m-%d %H:%M:%S'),
+            "level": record.levelname,
+            "message": record.getMessage(),
+            "service": "search"
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return orjson.dumps(entry).decode()
+
+log_handler = logging.StreamHandler(sys.stdout)
+log_handler.setFormatter(JSONFormatter())
+logging.basicConfig(level=logging.INFO, handlers=[log_handler])
 logger = logging.getLogger(__name__)
 
 # Create database tables
@@ -26,21 +43,29 @@ app = FastAPI(
     description="Serviço de busca avançada de pacientes",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=ORJSONResponse
 )
 
-# CORS configuration
+# CORS configuration (comma-separated CORS_ORIGINS; preflights cached for a day)
+CORS_ORIGINS = [origin.strip() for origin in os.getenv("CORS_ORIGINS", "*").split(",") if origin.strip()]
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],
+    allow_origins=CORS_ORIGINS,
     allow_credentials=True,
-    allow_methods=["*"],
+    allow_methods=["GET", "POST", "PUT", "DELETE"],
     allow_headers=["*"],
+    max_age=86400,
 )
 
 # Include routers
 app.include_router(search_router.router)
 
+@app.on_event("shutdown")
+async def shutdown_auth_client():
+    """Release the auth service connection pool"""
+    await close_auth_client()
+
 # Health check endpoint
 @app.get("/health", tags=["Health"])
 async def health_check():
@@ -63,10 +88,16 @@ async def root():
     }
 
 if __name__ == "__main__":
+    # Production runs several workers; set RELOAD=1 for local development
+    workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+    reload = os.getenv("RELOAD", "0") == "1"
     uvicorn.run(
         "main:app",
         host="0.0.0.0",
         port=8000,
-        reload=True,
+        workers=workers,
+        reload=reload,
+        loop="uvloop",
+        http="httptools",
         log_level="info"
     )
\ No newline at end of file
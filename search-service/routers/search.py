@@ -1,38 +1,196 @@
 """
 Search routes
 """
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from pydantic import TypeAdapter
 from sqlalchemy.orm import Session
-from sqlalchemy import or_, func
-from typing import Optional
+from sqlalchemy import or_, and_, func, select, exists, cast, literal, true, union_all
+from sqlalchemy.dialects.postgresql import JSONB
+from cachetools import TTLCache
+from typing import List, Optional
 from datetime import datetime, date
+import anyio
+import base64
+import binascii
 import logging
+import orjson
+import threading
+import uuid
 
 from database import get_db
 from models.patient import Patient
 from schemas.search import (
-    SearchResult, SearchResponse, AdvancedSearchParams, SuggestionsResponse
+    SearchResult, SearchResponse, AdvancedSearchParams, SuggestionsResponse,
+    BatchSuggestionsResponse
 )
 from utils.auth import verify_token
-from utils.search import calculate_match_score
+from utils.search import match_score_expression, name_exact_expression, score_batch
+from utils.cache import (
+    cache_get, cache_set, patients_version, suggestions_cache_key,
+    CACHE_ENABLED, SUGGESTIONS_CACHE_TTL
+)
 
 # Logger
 logger = logging.getLogger(__name__)
 
 # Create router
+# The Session is synchronous: search_patients is a plain `def` that FastAPI
+# runs on its threadpool, and async handlers hand DB work to anyio.to_thread
 router = APIRouter(
     prefix="/search",
     tags=["Search"]
 )
 
+# Distinct values of each suggestion field, shared by /suggestions and the
+# medical list filters (which answer substring terms with GIN-indexed @>
+# containment on the matching values); entries are keyed by the patient data
+# version, so a write retires them at once, and the TTL only bounds staleness
+# when the version is unknown
+VOCABULARY_FIELDS = ("medical_conditions", "medications", "allergies", "cities")
+VOCABULARY_TTL = 300
+VOCABULARY_MAX_MATCHES = 50
+_vocabulary_cache = TTLCache(maxsize=16, ttl=VOCABULARY_TTL)
+_vocabulary_cache_lock = threading.Lock()
+
+def _list_elements(column, dialect: str):
+    """Elements of a JSON list column as a table with one text column, value"""
+    if dialect == "postgresql":
+        return func.jsonb_array_elements_text(column).table_valued("value").alias()
+    return func.json_each(column).table_valued("value").alias()
+
+def _address_field(key: str, dialect: str):
+    """Text value of one key of the address JSON object"""
+    if dialect == "postgresql":
+        return func.jsonb_extract_path_text(Patient.address, key)
+    return func.json_extract(Patient.address, f"$.{key}")
+
+def _vocabulary_query(field: str, dialect: str):
+    """SELECT DISTINCT (field, value) over the values of one vocabulary field"""
+    label = literal(field).label("field")
+    if field == "cities":
+        return select(label, _address_field("city", dialect).label("value")).distinct()
+    
+    elements = _list_elements(getattr(Patient, field), dialect)
+    return select(label, elements.c.value).select_from(Patient).join(elements, true()).distinct()
+
+def _load_vocabularies(db: Session, fields, version: Optional[bytes]) -> dict:
+    """Sorted distinct values of several vocabulary fields (cached per process)
+    
+    Fields missing from the cache for this data version are loaded together in
+    one UNION ALL query.
+    """
+    with _vocabulary_cache_lock:
+        vocabularies = {field: _vocabulary_cache.get((field, version)) for field in fields}
+    missing = [field for field, values in vocabularies.items() if values is None]
+    if missing:
+        dialect = db.get_bind().dialect.name
+        queries = [_vocabulary_query(field, dialect) for field in missing]
+        stmt = queries[0] if len(queries) == 1 else union_all(*queries)
+        
+        loaded = {field: [] for field in missing}
+        for field, value in db.execute(stmt):
+            if value:
+                loaded[field].append(value)
+        for values in loaded.values():
+            values.sort()
+        with _vocabulary_cache_lock:
+            for field, values in loaded.items():
+                _vocabulary_cache[(field, version)] = vocabularies[field] = values
+    return vocabularies
+
+def _known_values(db: Session, field: str, version: Optional[bytes]) -> list:
+    """Sorted distinct values of a vocabulary field (cached per process)"""
+    return _load_vocabularies(db, [field], version)[field]
+
+def _suggest(values: list, prefix: str, limit: int) -> list:
+    """The first limit values starting with prefix, ignoring case"""
+    if prefix:
+        prefix = prefix.lower()
+        values = [v for v in values if v.lower().startswith(prefix)]
+    return values[:limit]
+
+def _list_contains(db: Session, column, term: str, version: Optional[bytes]):
+    """Filter for rows whose JSON list has an element containing term (case-insensitive)"""
+    dialect = db.get_bind().dialect.name
+    # The vocabulary may only stand in for the data when it is known to be
+    # current; a value it lacks would silently drop matching patients
+    if dialect == "postgresql" and version is not None:
+        needle = term.lower()
+        matches = [v for v in _known_values(db, column.key, version) if needle in v.lower()]
+        if 0 < len(matches) <= VOCABULARY_MAX_MATCHES:
+            return or_(*(column.op("@>")(cast([v], JSONB)) for v in matches))
+    
+    # Unknown or very broad terms, or an unknown data version, scan the list elements
+    elements = _list_elements(column, dialect)
+    return exists(select(1).select_from(elements).where(elements.c.value.ilike(f"%{term}%")))
+
+# Columns a SearchResult is built from (and score_batch reads)
+SEARCH_COLUMNS = (
+    Patient.id, Patient.name, Patient.cpf, Patient.birth_date, Patient.gender,
+    Patient.email, Patient.phone, Patient.medical_conditions,
+    Patient.medications, Patient.allergies
+)
+
+# Dashboards repeat the same searches while users navigate, so responses are
+# kept per process for a few seconds, keyed by every query parameter and the
+# patient data version patient-service bumps on writes; the TTL only bounds
+# staleness while that version is unknown (Redis unreachable)
+SEARCH_CACHE_TTL = 30
+_search_cache = TTLCache(maxsize=1024, ttl=SEARCH_CACHE_TTL)
+_search_cache_lock = threading.Lock()
+
+# Builds a page of SearchResults from rows in a single pydantic-core call
+_search_results_adapter = TypeAdapter(List[SearchResult])
+
+# Sortable fields and how their values are read back from a cursor
+SORT_COLUMNS = {
+    "name": (Patient.name, str),
+    "birth_date": (Patient.birth_date, date.fromisoformat),
+    "created_at": (Patient.created_at, datetime.fromisoformat),
+}
+
+def _years_before(day: date, years: int) -> date:
+    """The same calendar day `years` earlier (Feb 29 falls back to Feb 28)"""
+    try:
+        return day.replace(year=day.year - years)
+    except ValueError:
+        return day.replace(year=day.year - years, day=28)
+
+def _encode_cursor(values) -> str:
+    """Encode the last row's sort key values as an opaque cursor"""
+    # default=float covers Decimal scores from Postgres
+    return base64.urlsafe_b64encode(orjson.dumps(values, default=float)).decode()
+
+def _decode_cursor(cursor: str, sort_keys) -> list:
+    """Decode a cursor produced by _encode_cursor for the same sort keys"""
+    try:
+        values = orjson.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if not isinstance(values, list) or len(values) != len(sort_keys):
+            raise ValueError(cursor)
+        return [decode(value) for value, (_, _, decode) in zip(values, sort_keys)]
+    except (ValueError, TypeError, binascii.Error):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+def _after_cursor(sort_keys, values):
+    """Rows that come after the cursor position in the sort_keys ordering"""
+    # Keys may sort in different directions, so expand the row comparison by hand
+    clauses = []
+    for i, ((key, descending, _), value) in enumerate(zip(sort_keys, values)):
+        ties = [k == v for (k, _, _), v in zip(sort_keys[:i], values[:i])]
+        clauses.append(and_(*ties, key < value if descending else key > value))
+    return or_(*clauses)
+
 @router.get("/patients", response_model=SearchResponse)
-async def search_patients(
+def search_patients(
     # General search
     q: Optional[str] = Query(None, description="General search query"),
     
     # Specific field searches
     name: Optional[str] = Query(None, description="Patient name"),
-    cpf: Optional[str] = Query(None, description="CPF number"),
+    cpf: Optional[str] = Query(None, description="CPF number or its leading digits"),
     email: Optional[str] = Query(None, description="Email address"),
     phone: Optional[str] = Query(None, description="Phone number"),
     gender: Optional[str] = Query(None, description="Gender (M/F/O)"),
@@ -57,6 +215,7 @@ async def search_patients(
     # Pagination
     page: int = Query(1, ge=1),
     size: int = Query(10, ge=1, le=100),
+    after: Optional[str] = Query(None, description="Cursor returned as next_cursor by the previous page"),
     
     # Sorting
     sort_by: str = Query("name", description="Sort field"),
@@ -87,14 +246,26 @@ async def search_patients(
         state=state
     )
     
-    # Build query
-    query = db.query(Patient)
+    # The patient data version keys the response and vocabulary caches, so a
+    # write elsewhere is visible to the next search
+    version = anyio.from_thread.run(patients_version) if CACHE_ENABLED else None
+    cache_key = (version, params.model_dump_json(), page, size, after, sort_by, order)
+    if CACHE_ENABLED:
+        with _search_cache_lock:
+            cached = _search_cache.get(cache_key)
+        if cached is not None:
+            query_time = (datetime.now() - start_time).total_seconds() * 1000
+            return cached.model_copy(update={"query_time_ms": query_time})
+    
+    # Collect the filter predicates
+    filters = []
     filters_applied = {}
+    dialect = db.get_bind().dialect.name
     
     # General search (searches multiple fields)
     if params.query:
         search_term = f"%{params.query}%"
-        query = query.filter(
+        filters.append(
             or_(
                 Patient.name.ilike(search_term),
                 Patient.cpf.like(search_term),
@@ -107,134 +278,137 @@ async def search_patients(
     
     # Specific field filters
     if params.name:
-        query = query.filter(Patient.name.ilike(f"%{params.name}%"))
+        filters.append(Patient.name.ilike(f"%{params.name}%"))
         filters_applied["name"] = params.name
     
     if params.cpf:
-        query = query.filter(Patient.cpf.like(f"%{params.cpf}%"))
+        # Prefix match, served by the text_pattern_ops btree
+        filters.append(Patient.cpf.like(f"{params.cpf}%"))
         filters_applied["cpf"] = params.cpf
     
     if params.email:
-        query = query.filter(Patient.email.ilike(f"%{params.email}%"))
+        filters.append(Patient.email.ilike(f"%{params.email}%"))
         filters_applied["email"] = params.email
     
     if params.phone:
-        query = query.filter(Patient.phone.like(f"%{params.phone}%"))
+        filters.append(Patient.phone.like(f"%{params.phone}%"))
         filters_applied["phone"] = params.phone
     
     if params.gender:
-        query = query.filter(Patient.gender == params.gender.upper())
+        filters.append(Patient.gender == params.gender.upper())
         filters_applied["gender"] = params.gender
     
-    # Age filters (calculate from birth_date)
+    # Age filters become birth_date ranges (index-friendly constants):
+    # age >= n  <=>  born on or before the day n years ago
     if params.age_min is not None or params.age_max is not None:
         today = date.today()
         
         if params.age_max is not None:
-            min_birth_date = date(today.year - params.age_max - 1, today.month, today.day)
-            query = query.filter(Patient.birth_date >= min_birth_date)
+            filters.append(Patient.birth_date > _years_before(today, params.age_max + 1))
             filters_applied["age_max"] = str(params.age_max)
         
         if params.age_min is not None:
-            max_birth_date = date(today.year - params.age_min, today.month, today.day)
-            query = query.filter(Patient.birth_date <= max_birth_date)
+            filters.append(Patient.birth_date <= _years_before(today, params.age_min))
             filters_applied["age_min"] = str(params.age_min)
     
     # Date range filters
     if params.birth_date_from:
-        query = query.filter(Patient.birth_date >= params.birth_date_from)
+        filters.append(Patient.birth_date >= params.birth_date_from)
         filters_applied["birth_date_from"] = str(params.birth_date_from)
     
     if params.birth_date_to:
-        query = query.filter(Patient.birth_date <= params.birth_date_to)
+        filters.append(Patient.birth_date <= params.birth_date_to)
         filters_applied["birth_date_to"] = str(params.birth_date_to)
     
     # Medical condition filter (searches in JSON array)
     if params.medical_condition:
-        query = query.filter(
-            func.jsonb_array_elements_text(Patient.medical_conditions).op('ILIKE')(f'%{params.medical_condition}%')
-        )
+        filters.append(_list_contains(db, Patient.medical_conditions, params.medical_condition, version))
         filters_applied["medical_condition"] = params.medical_condition
     
     # Medication filter
     if params.medication:
-        query = query.filter(
-            func.jsonb_array_elements_text(Patient.medications).op('ILIKE')(f'%{params.medication}%')
-        )
+        filters.append(_list_contains(db, Patient.medications, params.medication, version))
         filters_applied["medication"] = params.medication
     
     # Allergy filter
     if params.allergy:
-        query = query.filter(
-            func.jsonb_array_elements_text(Patient.allergies).op('ILIKE')(f'%{params.allergy}%')
-        )
+        filters.append(_list_contains(db, Patient.allergies, params.allergy, version))
         filters_applied["allergy"] = params.allergy
     
     # Address filters (searches in JSON object)
     if params.city:
-        query = query.filter(
-            func.jsonb_extract_path_text(Patient.address, 'city').op('ILIKE')(f'%{params.city}%')
-        )
+        filters.append(_address_field("city", dialect).ilike(f"%{params.city}%"))
         filters_applied["city"] = params.city
     
     if params.state:
-        query = query.filter(
-            func.jsonb_extract_path_text(Patient.address, 'state').op('ILIKE')(f'%{params.state}%')
-        )
+        filters.append(_address_field("state", dialect).ilike(f"%{params.state}%"))
         filters_applied["state"] = params.state
     
-    # Get total count
-    total = query.count()
-    
-    # Apply sorting
-    if sort_by == "name":
-        query = query.order_by(Patient.name.asc() if order == "asc" else Patient.name.desc())
-    elif sort_by == "birth_date":
-        query = query.order_by(Patient.birth_date.asc() if order == "asc" else Patient.birth_date.desc())
-    elif sort_by == "created_at":
-        query = query.order_by(Patient.created_at.asc() if order == "asc" else Patient.created_at.desc())
-    else:
-        query = query.order_by(Patient.name.asc())
-    
-    # Apply pagination
-    offset = (page - 1) * size
-    patients = query.offset(offset).limit(size).all()
-    
-    # Build results with scoring
-    results = []
-    for patient in patients:
-        score = calculate_match_score(patient, params)
-        result = SearchResult(
-            id=str(patient.id),
-            name=patient.name,
-            cpf=patient.cpf,
-            birth_date=patient.birth_date,
-            age=SearchResult.calculate_age(patient.birth_date),
-            gender=patient.gender,
-            email=patient.email,
-            phone=patient.phone,
-            medical_conditions=patient.medical_conditions or [],
-            medications=patient.medications or [],
-            allergies=patient.allergies or [],
-            match_score=score
-        )
-        results.append(result)
-    
-    # Sort by relevance score if we have search criteria
+    # Only the columns a SearchResult needs, with every filter applied at once
+    columns = list(SEARCH_COLUMNS)
+    if params.name:
+        # The exact-name bonus is decided in SQL, next to the name filter
+        columns.append(name_exact_expression(params).label("name_exact"))
+    filtered = db.query(*columns).filter(*filters)
+    query = filtered
+    
+    # Sort keys: relevance when ranking applies, the requested field, then id
+    # so every row has a unique position for the cursor
+    sort_column, decode = SORT_COLUMNS.get(sort_by, SORT_COLUMNS["name"])
+    descending = sort_by in SORT_COLUMNS and order != "asc"
+    sort_keys = []
     if params.query or params.medical_condition or params.medication:
-        results.sort(key=lambda x: x.match_score, reverse=True)
+        relevance = match_score_expression(params)
+        if relevance is not None:
+            sort_keys.append((relevance, True, float))
+    sort_keys.append((sort_column, descending, decode))
+    sort_keys.append((Patient.id, descending, uuid.UUID))
+    
+    query = query.add_columns(
+        *(key.label(f"sort_key_{i}") for i, (key, _, _) in enumerate(sort_keys))
+    ).order_by(*(key.desc() if desc else key.asc() for key, desc, _ in sort_keys))
+    
+    if after:
+        # Keyset pagination seeks straight past the cursor and skips the count
+        query = query.filter(_after_cursor(sort_keys, _decode_cursor(after, sort_keys)))
+    else:
+        # The total rides along with the page as a window count
+        query = query.add_columns(func.count().over().label("total_count")).offset((page - 1) * size)
+    
+    # One extra row tells whether there is a next page
+    rows = query.limit(size + 1).all()
+    total = None
+    if not after:
+        # An empty page has no row to carry the window count
+        total = rows[0].total_count if rows else filtered.order_by(None).count()
+    next_cursor = None
+    if len(rows) > size:
+        last = rows[size - 1]
+        next_cursor = _encode_cursor([getattr(last, f"sort_key_{i}") for i in range(len(sort_keys))])
+    
+    # Validate the whole page in one call, then score it
+    rows = rows[:size]
+    results = _search_results_adapter.validate_python(rows, from_attributes=True)
+    # Every row passed the WHERE clause, so score_batch only adds per-row bonuses
+    for result, score in zip(results, score_batch(rows, params)):
+        result.match_score = score
     
     # Calculate query time
     query_time = (datetime.now() - start_time).total_seconds() * 1000
     
-    logger.info(f"Search completed: {total} results, {query_time:.2f}ms")
+    logger.info("Search completed: %d results, %.2fms", len(results), query_time)
     
-    return SearchResponse(
+    response = SearchResponse(
         results=results,
         total=total,
         query_time_ms=query_time,
-        filters_applied=filters_applied
+        filters_applied=filters_applied,
+        next_cursor=next_cursor
     )
+    if CACHE_ENABLED:
+        with _search_cache_lock:
+            _search_cache[cache_key] = response
+    return response
 
 @router.get("/suggestions", response_model=SuggestionsResponse)
 async def get_suggestions(
@@ -245,52 +419,54 @@ async def get_suggestions(
     # auth: dict = Depends(verify_token)
 ):
     """Get autocomplete suggestions for search fields"""
-    suggestions = []
+    if field not in VOCABULARY_FIELDS:
+        return SuggestionsResponse(field=field, suggestions=[], count=0)
     
-    if field == "medical_conditions":
-        # Get all unique medical conditions
-        all_conditions = db.query(func.jsonb_array_elements_text(Patient.medical_conditions)).distinct().all()
-        conditions = [c[0] for c in all_conditions if c[0]]
-        
-        if prefix:
-            conditions = [c for c in conditions if c.lower().startswith(prefix.lower())]
-        
-        suggestions = sorted(conditions)[:limit]
+    # Every keystroke asks again; serve repeats from Redis until a patient write
+    version = await patients_version()
+    cache_key = suggestions_cache_key(field, prefix, limit, version or b"0")
+    cached = await cache_get(cache_key)
+    if cached:
+        return SuggestionsResponse.model_validate(orjson.loads(cached))
     
-    elif field == "medications":
-        # Get all unique medications
-        all_meds = db.query(func.jsonb_array_elements_text(Patient.medications)).distinct().all()
-        meds = [m[0] for m in all_meds if m[0]]
-        
-        if prefix:
-            meds = [m for m in meds if m.lower().startswith(prefix.lower())]
-        
-        suggestions = sorted(meds)[:limit]
+    # A vocabulary refresh runs a blocking query
+    values = await anyio.to_thread.run_sync(_known_values, db, field, version)
     
-    elif field == "allergies":
-        # Get all unique allergies
-        all_allergies = db.query(func.jsonb_array_elements_text(Patient.allergies)).distinct().all()
-        allergies = [a[0] for a in all_allergies if a[0]]
-        
-        if prefix:
-            allergies = [a for a in allergies if a.lower().startswith(prefix.lower())]
-        
-        suggestions = sorted(allergies)[:limit]
-    
-    elif field == "cities":
-        # Get unique cities from addresses
-        cities = db.query(
-            func.jsonb_extract_path_text(Patient.address, 'city')
-        ).distinct().all()
-        cities = [c[0] for c in cities if c[0]]
-        
-        if prefix:
-            cities = [c for c in cities if c.lower().startswith(prefix.lower())]
-        
-        suggestions = sorted(cities)[:limit]
-    
-    return SuggestionsResponse(
+    suggestions = _suggest(values, prefix, limit)
+    response = SuggestionsResponse(
         field=field,
         suggestions=suggestions,
         count=len(suggestions)
-    )
\ No newline at end of file
+    )
+    await cache_set(cache_key, orjson.dumps(response.model_dump()), SUGGESTIONS_CACHE_TTL)
+    return response
+
+@router.get("/suggestions/batch", response_model=BatchSuggestionsResponse)
+async def get_suggestions_batch(
+    fields: List[str] = Query(..., description="Fields to get suggestions for (comma-separated or repeated)"),
+    prefix: str = Query("", description="Prefix to filter suggestions"),
+    limit: int = Query(10, ge=1, le=50),
+    db: Session = Depends(get_db),
+    # auth: dict = Depends(verify_token)
+):
+    """Get autocomplete suggestions for several fields in one request"""
+    fields = list(dict.fromkeys(
+        field.strip() for value in fields for field in value.split(",") if field.strip()
+    ))
+    
+    version = await patients_version()
+    cache_key = suggestions_cache_key(",".join(sorted(fields)), prefix, limit, version or b"0")
+    cached = await cache_get(cache_key)
+    if cached:
+        return BatchSuggestionsResponse.model_validate(orjson.loads(cached))
+    
+    # Uncached vocabularies come back from a single query
+    known = [field for field in fields if field in VOCABULARY_FIELDS]
+    vocabularies = await anyio.to_thread.run_sync(_load_vocabularies, db, known, version)
+    
+    response = BatchSuggestionsResponse(suggestions={
+        field: _suggest(vocabularies.get(field, []), prefix, limit)
+        for field in fields
+    })
+    await cache_set(cache_key, orjson.dumps(response.model_dump()), SUGGESTIONS_CACHE_TTL)
+    return response
@@ -1,7 +1,7 @@
 """
 Pydantic schemas for search service
 """
-from pydantic import BaseModel
+from pydantic import BaseModel, computed_field, validator
 from typing import Optional, List, Dict
 from datetime import date
 
@@ -11,7 +11,6 @@ class SearchResult(BaseModel):
     name: str
     cpf: str
     birth_date: date
-    age: int
     gender: str
     email: Optional[str]
     phone: Optional[str]
@@ -20,17 +19,36 @@ class SearchResult(BaseModel):
     allergies: List[str]
     match_score: float = 1.0
     
+    @validator('id', pre=True)
+    def stringify_id(cls, v):
+        # Rows carry a UUID; the API exposes it as a string
+        return str(v)
+    
+    @validator('medical_conditions', 'medications', 'allergies', pre=True)
+    def default_empty_list(cls, v):
+        return v or []
+    
+    @computed_field
+    @property
+    def age(self) -> int:
+        """Age in whole years, derived from birth_date when serialized"""
+        return self.calculate_age(self.birth_date)
+    
     @staticmethod
     def calculate_age(birth_date: date) -> int:
         today = date.today()
         return today.year - birth_date.year - ((today.month, today.day) < (birth_date.month, birth_date.day))
+    
+    class Config:
+        from_attributes = True
 
 class SearchResponse(BaseModel):
     """Search response schema"""
     results: List[SearchResult]
-    total: int
+    total: Optional[int] = None  # Not computed when paginating with a cursor
     query_time_ms: float
     filters_applied: Dict[str, str]
+    next_cursor: Optional[str] = None
 
 class AdvancedSearchParams(BaseModel):
     """Advanced search parameters"""
@@ -54,4 +72,8 @@ class SuggestionsResponse(BaseModel):
     """Suggestions response schema"""
     field: str
     suggestions: List[str]
-    count: int
\ No newline at end of file
+    count: int
+
+class BatchSuggestionsResponse(BaseModel):
+    """Suggestions for several fields, keyed by field"""
+    suggestions: Dict[str, List[str]]
@@ -2,9 +2,10 @@
 Tests for Search Service
 """
 import pytest
-from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+import httpx
+from sqlalchemy import create_engine, event, insert, select
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
 from datetime import date, datetime, timedelta
 import sys
 import os
@@ -13,34 +14,73 @@ import uuid
 # Add parent directory to path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+# Keep responses out of Redis so each test sees its own data
+os.environ.setdefault("CACHE_ENABLED", "false")
+
 from main import app
 from database import Base, get_db
 from models.patient import Patient
+from routers.search import SEARCH_COLUMNS
+from schemas.search import AdvancedSearchParams
+from utils.search import match_score_expression, name_exact_expression, score_batch
+
+# Test database: one in-memory SQLite database behind a single shared connection;
+# it lives in this process, so each pytest-xdist worker (pytest -n auto) gets its own
+SQLALCHEMY_DATABASE_URL = "sqlite://"
+engine = create_engine(
+    SQLALCHEMY_DATABASE_URL,
+    connect_args={"check_same_thread": False},
+    poolclass=StaticPool
+)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False)
+
+# pysqlite handles transactions itself; hand BEGIN back to SQLAlchemy so the
+# per-test SAVEPOINTs below behave
+@event.listens_for(engine, "connect")
+def do_connect(dbapi_connection, connection_record):
+    dbapi_connection.isolation_level = None
 
-# Test database
-SQLALCHEMY_DATABASE_URL = "sqlite:///./test_search.db"
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
-TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+@event.listens_for(engine, "begin")
+def do_begin(conn):
+    conn.exec_driver_sql("BEGIN")
 
-Base.metadata.create_all(bind=engine)
+@pytest.fixture(scope="session", autouse=True)
+def _schema():
+    """Create the tables once per test session"""
+    Base.metadata.create_all(bind=engine)
+    yield
+    Base.metadata.drop_all(bind=engine)
 
-def override_get_db():
-    try:
-        db = TestingSessionLocal()
-        yield db
-    finally:
-        db.close()
+@pytest.fixture(autouse=True)
+def db_session(_schema):
+    """Give each test a session whose changes are rolled back afterwards"""
+    connection = engine.connect()
+    transaction = connection.begin()
+    # Commits in fixtures and endpoints only release SAVEPOINTs inside the outer transaction
+    session = TestingSessionLocal(bind=connection, join_transaction_mode="create_savepoint")
+    
+    def override_get_db():
+        yield session
+    
+    app.dependency_overrides[get_db] = override_get_db
+    yield session
+    
+    app.dependency_overrides.pop(get_db, None)
+    session.close()
+    transaction.rollback()
+    connection.close()
 
-app.dependency_overrides[get_db] = override_get_db
+# Requests go straight into the ASGI app on the test's event loop, with no
+# thread bridging each call as TestClient does
+client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
 
-client = TestClient(app)
+pytestmark = pytest.mark.asyncio
 
 @pytest.fixture
-def sample_patients():
+def sample_patients(db_session):
     """Create sample patients in database"""
-    db = TestingSessionLocal()
     patients = [
-        Patient(
+        dict(
             id=uuid.uuid4(),
             name="João Silva",
             cpf="12345678901",
@@ -53,7 +93,7 @@ def sample_patients():
             medications=["Losartana", "Metformina"],
             allergies=["Dipirona"]
         ),
-        Patient(
+        dict(
             id=uuid.uuid4(),
             name="Maria Santos",
             cpf="98765432100",
@@ -66,7 +106,7 @@ def sample_patients():
             medications=["Salbutamol"],
             allergies=["Penicilina"]
         ),
-        Patient(
+        dict(
             id=uuid.uuid4(),
             name="Pedro Oliveira",
             cpf="55555555555",
@@ -81,53 +121,47 @@ def sample_patients():
         )
     ]
     
-    for patient in patients:
-        db.add(patient)
-    db.commit()
+    # One executemany INSERT instead of flushing ORM objects through the unit of work
+    db_session.execute(insert(Patient), patients)
+    db_session.commit()
     
-    yield patients
-    
-    # Cleanup
-    db.query(Patient).delete()
-    db.commit()
-    db.close()
-
-@pytest.fixture(autouse=True)
-def cleanup():
-    """Clean up database before each test"""
-    Base.metadata.drop_all(bind=engine)
-    Base.metadata.create_all(bind=engine)
-    yield
+    return patients
 
 class TestSearchEndpoints:
     """Test search endpoints"""
     
-    def test_health_check(self):
+    async def test_health_check(self):
         """Test health check endpoint"""
-        response = client.get("/health")
+        response = await client.get("/health")
         assert response.status_code == 200
         assert response.json()["status"] == "healthy"
     
-    def test_search_by_name(self, sample_patients):
+    async def test_search_by_name(self, sample_patients):
         """Test searching by patient name"""
-        response = client.get("/search/patients?name=João")
+        response = await client.get("/search/patients?name=João")
         assert response.status_code == 200
         data = response.json()
         assert data["total"] == 1
         assert data["results"][0]["name"] == "João Silva"
         assert "name" in data["filters_applied"]
     
-    def test_search_by_cpf(self, sample_patients):
+    async def test_search_by_cpf(self, sample_patients):
         """Test searching by CPF"""
-        response = client.get("/search/patients?cpf=123456")
+        response = await client.get("/search/patients?cpf=123456")
         assert response.status_code == 200
         data = response.json()
         assert data["total"] == 1
         assert data["results"][0]["cpf"] == "12345678901"
     
-    def test_search_by_medical_condition(self, sample_patients):
+    async def test_search_by_cpf_matches_prefix(self, sample_patients):
+        """Test that CPF search matches leading digits only"""
+        response = await client.get("/search/patients?cpf=5678")
+        assert response.status_code == 200
+        assert response.json()["total"] == 0
+    
+    async def test_search_by_medical_condition(self, sample_patients):
         """Test searching by medical condition"""
-        response = client.get("/search/patients?condition=Diabetes")
+        response = await client.get("/search/patients?condition=Diabetes")
         assert response.status_code == 200
         data = response.json()
         assert data["total"] == 2  # João and Pedro have Diabetes
@@ -136,111 +170,111 @@ class TestSearchEndpoints:
         assert "João Silva" in names
         assert "Pedro Oliveira" in names
     
-    def test_search_by_medication(self, sample_patients):
+    async def test_search_by_medication(self, sample_patients):
         """Test searching by medication"""
-        response = client.get("/search/patients?medication=Salbutamol")
+        response = await client.get("/search/patients?medication=Salbutamol")
         assert response.status_code == 200
         data = response.json()
         assert data["total"] == 1
         assert data["results"][0]["name"] == "Maria Santos"
     
-    def test_search_by_allergy(self, sample_patients):
+    async def test_search_by_allergy(self, sample_patients):
         """Test searching by allergy"""
-        response = client.get("/search/patients?allergy=Dipirona")
+        response = await client.get("/search/patients?allergy=Dipirona")
         assert response.status_code == 200
         data = response.json()
         assert data["total"] == 1
         assert data["results"][0]["name"] == "João Silva"
     
-    def test_search_by_city(self, sample_patients):
+    async def test_search_by_city(self, sample_patients):
         """Test searching by city"""
-        response = client.get("/search/patients?city=São Paulo")
+        response = await client.get("/search/patients?city=São Paulo")
         assert response.status_code == 200
         data = response.json()
         assert data["total"] == 1
         assert data["results"][0]["name"] == "João Silva"
     
-    def test_search_by_state(self, sample_patients):
+    async def test_search_by_state(self, sample_patients):
         """Test searching by state"""
-        response = client.get("/search/patients?state=RJ")
+        response = await client.get("/search/patients?state=RJ")
         assert response.status_code == 200
         data = response.json()
         assert data["total"] == 1
         assert data["results"][0]["name"] == "Maria Santos"
     
-    def test_search_by_gender(self, sample_patients):
+    async def test_search_by_gender(self, sample_patients):
         """Test searching by gender"""
-        response = client.get("/search/patients?gender=F")
+        response = await client.get("/search/patients?gender=F")
         assert response.status_code == 200
         data = response.json()
         assert data["total"] == 1
         assert data["results"][0]["name"] == "Maria Santos"
     
-    def test_search_by_age_range(self, sample_patients):
+    async def test_search_by_age_range(self, sample_patients):
         """Test searching by age range"""
         # Calculate ages for proper filtering
-        response = client.get("/search/patients?age_min=20&age_max=30")
+        response = await client.get("/search/patients?age_min=20&age_max=30")
         assert response.status_code == 200
         data = response.json()
         # Pedro was born in 2000, so he should be in this range
         assert any(r["name"] == "Pedro Oliveira" for r in data["results"])
     
-    def test_general_search(self, sample_patients):
+    async def test_general_search(self, sample_patients):
         """Test general search across multiple fields"""
-        response = client.get("/search/patients?q=maria")
+        response = await client.get("/search/patients?q=maria")
         assert response.status_code == 200
         data = response.json()
         assert data["total"] >= 1
         assert any(r["name"] == "Maria Santos" for r in data["results"])
     
-    def test_combined_filters(self, sample_patients):
+    async def test_combined_filters(self, sample_patients):
         """Test searching with multiple filters"""
-        response = client.get("/search/patients?gender=M&condition=Diabetes")
+        response = await client.get("/search/patients?gender=M&condition=Diabetes")
         assert response.status_code == 200
         data = response.json()
         # João and Pedro are male with Diabetes
         assert data["total"] == 2
     
-    def test_pagination(self, sample_patients):
+    async def test_pagination(self, sample_patients):
         """Test pagination in search results"""
-        response = client.get("/search/patients?page=1&size=2")
+        response = await client.get("/search/patients?page=1&size=2")
         assert response.status_code == 200
         data = response.json()
         assert len(data["results"]) <= 2
         
         # Second page
-        response2 = client.get("/search/patients?page=2&size=2")
+        response2 = await client.get("/search/patients?page=2&size=2")
         assert response2.status_code == 200
         data2 = response2.json()
         assert len(data2["results"]) <= 2
     
-    def test_sorting(self, sample_patients):
+    async def test_sorting(self, sample_patients):
         """Test sorting search results"""
         # Sort by name ascending
-        response = client.get("/search/patients?sort_by=name&order=asc")
+        response = await client.get("/search/patients?sort_by=name&order=asc")
         assert response.status_code == 200
         data = response.json()
         names = [r["name"] for r in data["results"]]
         assert names == sorted(names)
         
         # Sort by name descending
-        response = client.get("/search/patients?sort_by=name&order=desc")
+        response = await client.get("/search/patients?sort_by=name&order=desc")
         assert response.status_code == 200
         data = response.json()
         names = [r["name"] for r in data["results"]]
         assert names == sorted(names, reverse=True)
     
-    def test_empty_search(self):
+    async def test_empty_search(self):
         """Test search with no results"""
-        response = client.get("/search/patients?name=NonExistent")
+        response = await client.get("/search/patients?name=NonExistent")
         assert response.status_code == 200
         data = response.json()
         assert data["total"] == 0
         assert len(data["results"]) == 0
     
-    def test_search_response_time(self, sample_patients):
+    async def test_search_response_time(self, sample_patients):
         """Test that search response includes query time"""
-        response = client.get("/search/patients?name=João")
+        response = await client.get("/search/patients?name=João")
         assert response.status_code == 200
         data = response.json()
         assert "query_time_ms" in data
@@ -249,9 +283,9 @@ class TestSearchEndpoints:
 class TestSuggestionsEndpoint:
     """Test autocomplete suggestions"""
     
-    def test_medical_conditions_suggestions(self, sample_patients):
+    async def test_medical_conditions_suggestions(self, sample_patients):
         """Test getting medical condition suggestions"""
-        response = client.get("/search/suggestions?field=medical_conditions")
+        response = await client.get("/search/suggestions?field=medical_conditions")
         assert response.status_code == 200
         data = response.json()
         assert data["field"] == "medical_conditions"
@@ -259,9 +293,9 @@ class TestSuggestionsEndpoint:
         assert "Hipertensão" in data["suggestions"]
         assert "Asma" in data["suggestions"]
     
-    def test_medications_suggestions(self, sample_patients):
+    async def test_medications_suggestions(self, sample_patients):
         """Test getting medication suggestions"""
-        response = client.get("/search/suggestions?field=medications")
+        response = await client.get("/search/suggestions?field=medications")
         assert response.status_code == 200
         data = response.json()
         assert data["field"] == "medications"
@@ -269,18 +303,18 @@ class TestSuggestionsEndpoint:
         assert "Metformina" in data["suggestions"]
         assert "Salbutamol" in data["suggestions"]
     
-    def test_allergies_suggestions(self, sample_patients):
+    async def test_allergies_suggestions(self, sample_patients):
         """Test getting allergy suggestions"""
-        response = client.get("/search/suggestions?field=allergies")
+        response = await client.get("/search/suggestions?field=allergies")
         assert response.status_code == 200
         data = response.json()
         assert data["field"] == "allergies"
         assert "Dipirona" in data["suggestions"]
         assert "Penicilina" in data["suggestions"]
     
-    def test_cities_suggestions(self, sample_patients):
+    async def test_cities_suggestions(self, sample_patients):
         """Test getting city suggestions"""
-        response = client.get("/search/suggestions?field=cities")
+        response = await client.get("/search/suggestions?field=cities")
         assert response.status_code == 200
         data = response.json()
         assert data["field"] == "cities"
@@ -288,28 +322,74 @@ class TestSuggestionsEndpoint:
         assert "Rio de Janeiro" in data["suggestions"]
         assert "Belo Horizonte" in data["suggestions"]
     
-    def test_suggestions_with_prefix(self, sample_patients):
+    async def test_suggestions_with_prefix(self, sample_patients):
         """Test suggestions with prefix filtering"""
-        response = client.get("/search/suggestions?field=medical_conditions&prefix=Dia")
+        response = await client.get("/search/suggestions?field=medical_conditions&prefix=Dia")
         assert response.status_code == 200
         data = response.json()
         assert "Diabetes" in data["suggestions"]
         assert "Hipertensão" not in data["suggestions"]
     
-    def test_suggestions_limit(self, sample_patients):
+    async def test_suggestions_limit(self, sample_patients):
         """Test suggestions limit"""
-        response = client.get("/search/suggestions?field=medical_conditions&limit=2")
+        response = await client.get("/search/suggestions?field=medical_conditions&limit=2")
         assert response.status_code == 200
         data = response.json()
         assert len(data["suggestions"]) <= 2
+    
+    async def test_batch_suggestions(self, sample_patients):
+        """Test suggestions for several fields in one request"""
+        response = await client.get("/search/suggestions/batch?fields=medications&fields=cities&fields=unknown&prefix=S")
+        assert response.status_code == 200
+        data = response.json()["suggestions"]
+        assert data["medications"] == ["Salbutamol"]
+        assert data["cities"] == ["São Paulo"]
+        assert data["unknown"] == []
+        
+        # Comma-separated fields are the same request
+        response = await client.get("/search/suggestions/batch?fields=medications,cities,unknown&prefix=S")
+        assert response.json()["suggestions"] == data
+
+    async def test_suggestions_follow_patient_writes(self, db_session, sample_patients, monkeypatch):
+        """Test that a patient write shows up in suggestions once the data version moves"""
+        from cachetools import TTLCache
+        from routers import search as search_router
+        
+        # Stand in for the Redis counter patient-service bumps on every write
+        version = [b"1"]
+        
+        async def patients_version():
+            return version[0]
+        
+        monkeypatch.setattr(search_router, "patients_version", patients_version)
+        monkeypatch.setattr(search_router, "_vocabulary_cache", TTLCache(maxsize=16, ttl=300))
+        
+        response = await client.get("/search/suggestions?field=medical_conditions")
+        assert "Enxaqueca" not in response.json()["suggestions"]
+        
+        db_session.add(Patient(
+            id=uuid.uuid4(),
+            name="Ana Costa",
+            cpf="22222222222",
+            birth_date=date(1995, 3, 10),
+            gender="F",
+            medical_conditions=["Enxaqueca"]
+        ))
+        db_session.commit()
+        version[0] = b"2"
+        
+        response = await client.get("/search/suggestions?field=medical_conditions")
+        assert "Enxaqueca" in response.json()["suggestions"]
+        
+        response = await client.get("/search/suggestions/batch?fields=medical_conditions&prefix=enx")
+        assert response.json()["suggestions"]["medical_conditions"] == ["Enxaqueca"]
 
 class TestSearchScoring:
     """Test search relevance scoring"""
     
-    def test_exact_match_higher_score(self, sample_patients):
+    async def test_exact_match_higher_score(self, db_session, sample_patients):
         """Test that exact matches get higher scores"""
         # Create a patient with exact name match
-        db = TestingSessionLocal()
         exact_patient = Patient(
             id=uuid.uuid4(),
             name="Silva",
@@ -317,20 +397,47 @@ class TestSearchScoring:
             birth_date=date(1990, 1, 1),
             gender="M"
         )
-        db.add(exact_patient)
-        db.commit()
+        db_session.add(exact_patient)
+        db_session.commit()
         
-        response = client.get("/search/patients?name=Silva")
+        response = await client.get("/search/patients?name=Silva")
         assert response.status_code == 200
         data = response.json()
         
         # The exact match should have higher score
         results = sorted(data["results"], key=lambda x: x["match_score"], reverse=True)
         assert results[0]["name"] == "Silva"
+    
+    async def test_batch_scores_match_sql_relevance(self, db_session, sample_patients):
+        """Test that score_batch and match_score_expression agree on filtered rows"""
+        db_session.add(Patient(
+            id=uuid.uuid4(),
+            name="Silva",
+            cpf="10000000001",
+            birth_date=date(1980, 7, 1),
+            gender="M",
+            email="silva@example.com",
+            phone="11900000000",
+            medical_conditions=["Diabetes tipo 2"]
+        ))
+        db_session.commit()
+        
+        # Both patients named Silva also match every other criterion
+        params = AdvancedSearchParams(
+            name="silva", cpf="1", email="example", phone="9", medical_condition="diab"
+        )
+        rows = db_session.execute(
+            select(
+                *SEARCH_COLUMNS,
+                name_exact_expression(params).label("name_exact"),
+                match_score_expression(params).label("sql_score")
+            ).where(Patient.name.ilike("%silva%")).order_by(Patient.name)
+        ).all()
+        assert [row.name for row in rows] == ["João Silva", "Silva"]
         
-        db.query(Patient).filter(Patient.cpf == "11111111111").delete()
-        db.commit()
-        db.close()
+        scores = score_batch(rows, params)
+        assert scores == pytest.approx([row.sql_score for row in rows])
+        assert scores[1] > scores[0]
 
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
\ No newline at end of file
@@ -0,0 +1,58 @@
+"""
+Redis cache helpers for search service
+"""
+import os
+import logging
+from typing import Optional
+import redis.asyncio as redis
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
+CACHE_ENABLED = os.getenv("CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+
+SUGGESTIONS_CACHE_TTL = 300
+
+# Bumped by patient-service on every patient write, so keys that embed it
+# go stale as soon as the data changes
+PATIENTS_VERSION_KEY = "patients:version"
+
+# Short timeouts so an unreachable Redis degrades to cache misses instead of stalling requests
+_client = redis.from_url(
+    REDIS_URL,
+    socket_timeout=0.5,
+    socket_connect_timeout=0.5
+) if CACHE_ENABLED else None
+
+def suggestions_cache_key(field: str, prefix: str, limit: int, version: bytes) -> str:
+    """Cache key of one suggestions response; prefixes match case-insensitively"""
+    return f"search:suggestions:v2:{version.decode()}:{field}:{limit}:{prefix.lower()}"
+
+async def cache_get(key: str) -> Optional[bytes]:
+    """Read a cached value; cache failures count as misses"""
+    if _client is None:
+        return None
+    try:
+        return await _client.get(key)
+    except redis.RedisError as e:
+        logger.warning("Cache read failed for %s: %s", key, e)
+        return None
+
+async def cache_set(key: str, value: bytes, ttl: int):
+    """Store a value with a TTL in seconds"""
+    if _client is None:
+        return
+    try:
+        await _client.set(key, value, ex=ttl)
+    except redis.RedisError as e:
+        logger.warning("Cache write failed for %s: %s", key, e)
+
+async def patients_version() -> Optional[bytes]:
+    """Current patient data version (b"0" before the first write); None when Redis can't tell"""
+    if _client is None:
+        return None
+    try:
+        return await _client.get(PATIENTS_VERSION_KEY) or b"0"
+    except redis.RedisError as e:
+        logger.warning("Cache read failed for %s: %s", PATIENTS_VERSION_KEY, e)
+        return None
@@ -1,66 +1,84 @@
 """
 Search utilities
 """
+from typing import List
+
+from sqlalchemy import case, func
+
+from models.patient import Patient
 from schemas.search import AdvancedSearchParams
 
-def calculate_match_score(patient, params: AdvancedSearchParams) -> float:
-    """Calculate relevance score for search results"""
-    score = 1.0
-    matches = 0
-    total_criteria = 0
+def score_batch(rows, params: AdvancedSearchParams) -> List[float]:
+    """Relevance scores for a page of search rows
     
-    if params.name:
-        total_criteria += 1
-        if params.name.lower() in patient.name.lower():
-            matches += 1
-            # Exact match gets higher score
-            if params.name.lower() == patient.name.lower():
-                score += 0.5
+    The rows come from a query that applied every filter of params, so each
+    criterion is known to match and the per-request part of the score is
+    worked out once; the loop only adds the bonuses that vary between rows.
+    """
+    name = params.name.lower() if params.name else None
+    email = params.email.lower() if params.email else None
     
+    score = 1.0
     if params.cpf:
-        total_criteria += 1
-        if params.cpf in patient.cpf:
-            matches += 1
-            score += 0.3
-    
+        score += 0.3
     if params.medical_condition:
-        total_criteria += 1
-        if patient.medical_conditions:
-            for condition in patient.medical_conditions:
-                if params.medical_condition.lower() in condition.lower():
-                    matches += 1
-                    score += 0.2
-                    break
-    
+        score += 0.2
     if params.medication:
-        total_criteria += 1
-        if patient.medications:
-            for med in patient.medications:
-                if params.medication.lower() in med.lower():
-                    matches += 1
-                    score += 0.1
-                    break
-    
+        score += 0.1
     if params.allergy:
-        total_criteria += 1
-        if patient.allergies:
-            for allergy in patient.allergies:
-                if params.allergy.lower() in allergy.lower():
-                    matches += 1
-                    score += 0.1
-                    break
+        score += 0.1
     
-    # Boost score for email match
-    if params.email and patient.email:
-        if params.email.lower() in patient.email.lower():
-            score += 0.2
+    scores = []
+    for patient in rows:
+        row_score = score
+        
+        # Rows carry the SQL exact-name test (name_exact_expression); their
+        # names are only lowered here when it wasn't selected
+        if name:
+            name_exact = getattr(patient, "name_exact", None)
+            if name_exact is None:
+                name_exact = name == patient.name.lower()
+            if name_exact:
+                row_score += 0.5
+        
+        if email and patient.email and email in patient.email.lower():
+            row_score += 0.2
+        
+        if params.phone and patient.phone and params.phone in patient.phone:
+            row_score += 0.2
+        
+        scores.append(min(row_score, 2.0))
     
-    # Boost score for phone match
-    if params.phone and patient.phone:
-        if params.phone in patient.phone:
-            score += 0.2
+    return scores
+
+def name_exact_expression(params: AdvancedSearchParams):
+    """SQL test for a case-insensitive exact match of the name term"""
+    return func.lower(Patient.name) == params.name.lower()
+
+def match_score_expression(params: AdvancedSearchParams):
+    """SQL twin of score_batch for rows that pass every search filter
+    
+    Each filter guarantees its own criterion matches, so only the exact-name
+    bonus varies between rows; returns None when every row scores the same.
+    """
+    if not params.name:
+        return None
     
-    if total_criteria > 0:
-        score *= (matches / total_criteria)
+    score = 1.0
+    if params.cpf:
+        score += 0.3
+    if params.medical_condition:
+        score += 0.2
+    if params.medication:
+        score += 0.1
+    if params.allergy:
+        score += 0.1
+    if params.email:
+        score += 0.2
+    if params.phone:
+        score += 0.2
     
-    return min(score, 2.0)  # Cap at 2.0
\ No newline at end of file
+    return case(
+        (name_exact_expression(params), min(score + 0.5, 2.0)),
+        else_=min(score, 2.0)
+    )